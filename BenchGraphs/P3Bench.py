@@ -20,9 +20,10 @@ class P3Bench(object):
         5. Clearing all the data (if needed).
     """
 
-    def __init__(self, max_seconds_per_query=60):
+    def __init__(self, max_seconds_per_query=60, batch_size=100):
         self.conf = P0Config.shared()
         self.max_seconds_per_query = max_seconds_per_query
+        self.batch_size = batch_size
         self.tasks = P3TasksSampler()
 
     def run(self, repeat_existing=False):
@@ -58,14 +59,14 @@ class P3Bench(object):
             )
 
         # Streaming edges.
-        # self.bench_task(
-        #     name='Sequential Reads: Streaming Edges',
-        #     func=self.stream_es
-        # )
-        # self.bench_task(
-        #     name='Sequential Reads: Streaming Nodes',
-        #     func=self.stream_ns
-        # )
+        self.bench_task(
+            name='Sequential Reads: Streaming Edges',
+            func=self.stream_es
+        )
+        self.bench_task(
+            name='Sequential Reads: Streaming Nodes',
+            func=self.stream_ns
+        )
 
         # Queries returning collections.
         self.bench_task(
@@ -84,6 +85,24 @@ class P3Bench(object):
             name='Random Reads: Find Friends',
             func=self.find_vs_related
         )
+        self.bench_task(
+            name='Random Reads: Find Friends of Friends',
+            func=self.find_vs_related_related
+        )
+
+        # Same queries answered in batches.
+        self.bench_task(
+            name='Random Reads: Find Specific Edges Batch',
+            func=self.find_es_batched
+        )
+        self.bench_task(
+            name='Random Reads: Find Friends Batch',
+            func=self.find_vs_related_batched
+        )
+        self.bench_task(
+            name='Random Reads: Count Friends Batch',
+            func=self.count_v_related_batched
+        )
 
         # Queries returning stats.
         self.bench_task(
@@ -283,6 +302,48 @@ class P3Bench(object):
         print(f'---- {cnt} ops: {cnt_found} related to related nodes')
         return cnt
 
+    def find_es_batched(self) -> int:
+        cnt = 0
+        cnt_found = 0
+        t0 = time()
+        for es in chunks(self.tasks.edges_to_query, self.batch_size):
+            matches = self.gdb.has_edges(
+                [e.first for e in es],
+                [e.second for e in es],
+            )
+            cnt += len(es)
+            cnt_found += int(matches.sum())
+            dt = time() - t0
+            if dt > self.max_seconds_per_query:
+                break
+        print(f'---- {cnt} ops: {cnt_found} undirected matches')
+        return cnt
+
+    def find_vs_related_batched(self) -> int:
+        cnt = 0
+        cnt_found = 0
+        t0 = time()
+        for vs in chunks(self.tasks.nodes_to_query, self.batch_size):
+            _, related = self.gdb.neighbors_many(vs)
+            cnt += len(vs)
+            cnt_found += len(related)
+            dt = time() - t0
+            if dt > self.max_seconds_per_query:
+                break
+        print(f'---- {cnt} ops: {cnt_found} related nodes')
+        return cnt
+
+    def count_v_related_batched(self) -> int:
+        cnt = 0
+        t0 = time()
+        for vs in chunks(self.tasks.nodes_to_query, self.batch_size):
+            self.gdb.number_of_edges_many(vs, vs)
+            cnt += len(vs)
+            dt = time() - t0
+            if dt > self.max_seconds_per_query:
+                break
+        return cnt
+
     def remove_e(self) -> int:
         cnt = 0
         for e in self.tasks.edges_to_change_by_one:
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import Sequence, Optional, Dict, Generator, Set, Tuple, Sequence
+from contextlib import contextmanager
+from typing import List, Sequence, Optional, Dict, Generator, Set, Tuple, Sequence
 import concurrent.futures
 import collections
 
+import numpy as np
+
 from PyStorageHelpers import *
 
 
@@ -22,10 +25,24 @@ class BaseAPI(object):
         Docs: https://networkx.github.io/documentation/stable/reference/classes/multidigraph.html
     """
     __max_batch_size__ = 100
+    # Number of entries fetched at once, when streaming `nodes` or `edges`.
+    __fetch_batch_size__ = 10000
     __is_concurrent__ = True
     __edge_type__ = Edge
     __node_type__ = Node
     __in_memory__ = False
+    # Whether `add_stream` can consume `EdgeBatch`es instead of single `Edge`s.
+    # Backends opt in, once their `add`/`add_stream` handle the columns.
+    __accepts_edge_batches__ = False
+    # Indexes created on edges by backends supporting them.
+    # Composite indexes start with the members and include `label` and `weight`,
+    # so that edge existence and degree queries can be answered from the index alone.
+    __edge_indexes__ = {
+        'index_first_second': ('first', 'second', 'label', 'weight'),
+        'index_second_first': ('second', 'first', 'label', 'weight'),
+        'index_label': ('label', ),
+        'index_directed': ('is_directed', ),
+    }
 
     def __init__(
         self,
@@ -111,7 +128,7 @@ class BaseAPI(object):
         """
             https://networkx.github.io/documentation/stable/reference/classes/generated/networkx.MultiDiGraph.out_edges.html
         """
-        return [e for e in self.edges if e.directed]
+        return (e for e in self.edges if e.is_directed)
 
     @property
     @abstractmethod
@@ -119,7 +136,7 @@ class BaseAPI(object):
         """
             https://networkx.github.io/documentation/stable/reference/classes/generated/networkx.MultiDiGraph.in_edges.html
         """
-        return [e.inverted() for e in self.out_edges]
+        return (e.inverted() for e in self.out_edges)
 
     @property
     @abstractmethod
@@ -213,16 +230,98 @@ class BaseAPI(object):
         else:
             return related_to_related.difference(related).difference({v})
 
+    def bfs(self, v: int, max_depth: int) -> Dict[int, int]:
+        """
+            Maps every node within `max_depth` hops from `v` (including `v` itself)
+            to the length of the shortest path to it, ignoring edge directions.
+        """
+        v = self.make_node_id(v)
+        depths = {v: 0}
+        frontier = {v}
+        for depth in range(1, max_depth + 1):
+            frontier = self.neighbors_of_group(frontier).difference(depths.keys())
+            if len(frontier) == 0:
+                break
+            for n in frontier:
+                depths[n] = depth
+        return depths
+
+    def k_hop_neighbors(self, v: int, k: int) -> Set[int]:
+        """
+            Returns IDs of nodes within `k` hops from `v`, excluding `v` itself.
+        """
+        v = self.make_node_id(v)
+        result = set(self.bfs(v, k).keys())
+        result.discard(v)
+        return result
+
+# region Batch Reads
+
+    def has_edges(self, us, vs, key=None) -> np.ndarray:
+        """
+            Batch version of `has_edge`.
+            Returns a boolean array with one entry per `(u, v)` pair.
+        """
+        return self.number_of_edges_many(us, vs, key) > 0
+
+    def number_of_edges_many(self, us, vs, key=None) -> np.ndarray:
+        """
+            Batch version of `number_of_edges`.
+        """
+        return self.reduce_edges_many(us, vs, key)[0]
+
+    def reduce_edges_many(self, us, vs, key=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Batch version of `reduce_edges`. Pairs follow the same rules,
+            so `us`, `vs` or their members can be set to `None`.
+            Returns `(counts, weights)` arrays with one entry per pair.
+            Backends override this to answer the batch in one round trip.
+        """
+        us, vs = self.make_node_ids_pairs(us, vs)
+        counts = np.zeros(len(us), dtype=np.int64)
+        weights = np.zeros(len(us), dtype=np.float64)
+        for i, (u, v) in enumerate(zip(us.tolist(), vs.tolist())):
+            d = self.reduce_edges(u, v, key)
+            counts[i] = d.count
+            weights[i] = d.weight or 0
+        return counts, weights
+
+    def neighbors_many(self, ns) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Batch version of `neighbors`.
+            Returns `(offsets, values)` arrays, where sorted IDs of neighbors
+            of `ns[i]` are `values[offsets[i]:offsets[i+1]]`.
+            Backends override this to answer the batch in one round trip.
+        """
+        ns = self.make_node_ids_array(ns)
+        related = [sorted(self.neighbors(n)) for n in ns.tolist()]
+        lengths = np.fromiter(map(len, related), dtype=np.int64, count=len(related))
+        offsets = np.zeros(len(related) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        values = np.fromiter(flatten(related), dtype=np.int64, count=offsets[-1])
+        return offsets, values
+
+    def has_nodes(self, ns) -> List[Optional[Node]]:
+        """
+            Batch version of `has_node`.
+            Returns a list with a `Node` or `None` for every ID in `ns`.
+            Backends override this to answer the batch in one round trip.
+        """
+        ns = self.make_node_ids_array(ns)
+        return [self.has_node(n) for n in ns.tolist()]
+
 
 # region Random Writes
 
     @abstractmethod
     def add(self, obj, upsert=True) -> int:
         """
-            Adds either an `Edge`, `Sequence[Edge]`, `Node` or `Sequence[Node]`.
+            Adds either an `Edge`, `Sequence[Edge]`, `EdgeBatch`, `Node` or `Sequence[Node]`.
             Other arguments aren't allowed.
         """
-        if is_sequence_of(obj, Edge) or is_sequence_of(obj, Node):
+        if isinstance(obj, EdgeBatch):
+            return self.add(obj.to_edges(type(self).__edge_type__), upsert=upsert)
+        elif is_sequence_of(obj, Edge) or is_sequence_of(obj, Node):
             return sum([self.add(o, upsert=upsert) for o in obj])
         else:
             return 0
@@ -230,11 +329,13 @@ class BaseAPI(object):
     @abstractmethod
     def remove(self, obj) -> int:
         """
-            Removes either an `Edge`, `Sequence[Edge]`, `Node` or `Sequence[Node]`.
+            Removes either an `Edge`, `Sequence[Edge]`, `EdgeBatch`, `Node` or `Sequence[Node]`.
             Other arguments aren't allowed.
             Can delete edges without a known ID, but it will work slower.
         """
-        if is_sequence_of(obj, Edge) or is_sequence_of(obj, Node):
+        if isinstance(obj, EdgeBatch):
+            return self.remove(obj.to_edges(type(self).__edge_type__))
+        elif is_sequence_of(obj, Edge) or is_sequence_of(obj, Node):
             return sum(map(self.remove, obj))
         else:
             return 0
@@ -274,7 +375,7 @@ class BaseAPI(object):
     @abstractmethod
     def add_stream(self, stream, upsert=True) -> int:
         """
-            Imports data from adjacency list CSV file. Row shape: `(first, second, weight)`.
+            Imports a stream of `Edge`s or `EdgeBatch`es in chunks of `__max_batch_size__`.
             Uses the `biggest_edge_id` to generate incremental IDs for new edges.
             Doesn't guarantee edge uniqness (for 2 given nodes) as `upsert_bulk` does.
         """
@@ -301,6 +402,76 @@ class BaseAPI(object):
         """
         pass
 
+# region Transactions
+
+    @contextmanager
+    def transaction(self):
+        """
+            Groups all the calls within the `with` block into a single
+            transaction or session, committed once at the end,
+            so that many small reads and writes share the overhead.
+            Nested scopes join the outer one.
+            Backends without transactions just execute the calls.
+        """
+        yield self
+
+    def batch(self):
+        """
+            Alias for `transaction()`.
+        """
+        return self.transaction()
+
+# region Indexes
+
+    def list_indexes(self) -> Dict[str, Tuple[str, ...]]:
+        """
+            Maps the names of existing secondary indexes on edges
+            to the fields they are built on.
+        """
+        return dict()
+
+    def create_index(self, name: str, fields: Sequence[str]) -> bool:
+        """
+            Builds a secondary index on edges, if the backend supports them.
+            The order of `fields` matters for composite indexes.
+        """
+        return False
+
+    def drop_index(self, name: str) -> bool:
+        return False
+
+    def create_indexes(self) -> int:
+        """
+            Creates the missing indexes from `__edge_indexes__`.
+        """
+        existing = self.list_indexes()
+        cnt = 0
+        for name, fields in type(self).__edge_indexes__.items():
+            if name not in existing:
+                cnt += self.create_index(name, fields)
+        return cnt
+
+    @contextmanager
+    def import_mode(self, rebuild_indexes=True):
+        """
+            Drops secondary indexes on edges for the duration of a bulk import
+            and rebuilds them in a single pass afterwards, instead of updating
+            B-trees on every inserted row.
+            Pass `rebuild_indexes=False` to call `create_indexes()` separately,
+            for example to measure its duration.
+        """
+        dropped = self.list_indexes()
+        for name in dropped.keys():
+            self.drop_index(name)
+        try:
+            yield self
+        finally:
+            if rebuild_indexes:
+                existing = self.list_indexes()
+                for name, fields in dropped.items():
+                    if name not in existing:
+                        self.create_index(name, fields)
+
 
 # region Helpers
 
@@ -364,3 +535,139 @@ class BaseAPI(object):
             result.add(e.first)
             result.add(e.second)
         return result
+
+    def make_node_ids_array(self, ns) -> np.ndarray:
+        if ns is None:
+            return np.zeros(0, dtype=np.int64)
+        if isinstance(ns, np.ndarray):
+            return ns.astype(np.int64, copy=False)
+        ns = [self.make_node_id(n) for n in ns]
+        return np.asarray(ns, dtype=np.int64)
+
+    def make_node_ids_pairs(self, us, vs) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Converts batch arguments into two aligned arrays of IDs,
+            where `-1` replaces `None`. Either side can be `None` entirely.
+        """
+        if us is None and vs is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        elif us is None:
+            vs = self.make_node_ids_array(vs)
+            return np.full(len(vs), -1, dtype=np.int64), vs
+        elif vs is None:
+            us = self.make_node_ids_array(us)
+            return us, np.full(len(us), -1, dtype=np.int64)
+        us = self.make_node_ids_array(us)
+        vs = self.make_node_ids_array(vs)
+        assert len(us) == len(vs), 'Batches of nodes must have the same length'
+        return us, vs
+
+    def split_pairs(self, us: np.ndarray, vs: np.ndarray) -> dict:
+        """
+            Classifies the pairs of a batch into groups, each of which can
+            be answered with a single grouped aggregation:
+            *   `pair_us`, `pair_vs`: directed edges between two specific nodes,
+            *   `outs`: nodes, which outgoing edges must be counted,
+            *   `ins`: nodes, which incoming edges must be counted,
+            *   `loops`: nodes, which self-loops must be subtracted,
+            *   `total`: if the whole graph must be reduced.
+            The results are combined with `assemble_reduced`.
+        """
+        has_u = us >= 0
+        has_v = vs >= 0
+        containing = has_u & has_v & (us == vs)
+        if not self.directed:
+            containing |= (has_u ^ has_v)
+        between = has_u & has_v & (us != vs)
+        only_u = has_u & ~has_v & ~containing
+        only_v = ~has_u & has_v & ~containing
+        ids_containing = np.where(has_u, us, vs)[containing]
+
+        pair_us = us[between]
+        pair_vs = vs[between]
+        if not self.directed:
+            pair_us, pair_vs = np.concatenate(
+                (pair_us, pair_vs)), np.concatenate((pair_vs, pair_us))
+        return dict(
+            pair_us=pair_us,
+            pair_vs=pair_vs,
+            outs=np.unique(np.concatenate((us[only_u], ids_containing))),
+            ins=np.unique(np.concatenate((vs[only_v], ids_containing))),
+            loops=np.unique(ids_containing),
+            total=bool((~has_u & ~has_v).any()),
+        )
+
+    def assemble_reduced(
+        self,
+        us: np.ndarray,
+        vs: np.ndarray,
+        pairs: Dict[Tuple[int, int], Tuple[int, float]],
+        outs: Dict[int, Tuple[int, float]],
+        ins: Dict[int, Tuple[int, float]],
+        loops: Dict[int, Tuple[int, float]],
+        total: Tuple[int, float] = (0, 0),
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Combines grouped `(count, weight)` aggregates, requested by `split_pairs`,
+            into `(counts, weights)` arrays aligned with the original pairs.
+        """
+        counts = np.zeros(len(us), dtype=np.int64)
+        weights = np.zeros(len(us), dtype=np.float64)
+        zero = (0, 0)
+        for i, (u, v) in enumerate(zip(us.tolist(), vs.tolist())):
+            if u < 0 and v < 0:
+                c, w = total
+            elif (u == v) or (not self.directed and (u < 0 or v < 0)):
+                n = max(u, v)
+                c_out, w_out = outs.get(n, zero)
+                c_in, w_in = ins.get(n, zero)
+                c_loop, w_loop = loops.get(n, zero)
+                c, w = c_out + c_in - c_loop, w_out + w_in - w_loop
+            elif v < 0:
+                c, w = outs.get(u, zero)
+            elif u < 0:
+                c, w = ins.get(v, zero)
+            else:
+                c, w = pairs.get((u, v), zero)
+                if not self.directed:
+                    c_back, w_back = pairs.get((v, u), zero)
+                    c, w = c + c_back, w + w_back
+            counts[i] = c
+            weights[i] = w or 0
+        return counts, weights
+
+    def group_neighbors(self, ns: np.ndarray, firsts: np.ndarray, seconds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Converts members of edges, fetched for a batch of nodes,
+            into the `(offsets, values)` format of `neighbors_many`.
+        """
+        owners = np.concatenate((firsts, seconds)).astype(np.int64, copy=False)
+        others = np.concatenate((seconds, firsts)).astype(np.int64, copy=False)
+        mask = np.isin(owners, ns) & (owners != others)
+        owners = owners[mask]
+        others = others[mask]
+        order = np.lexsort((others, owners))
+        owners = owners[order]
+        others = others[order]
+        if len(owners):
+            unique = np.ones(len(owners), dtype=np.bool_)
+            unique[1:] = (owners[1:] != owners[:-1]) | (
+                others[1:] != others[:-1])
+            owners = owners[unique]
+            others = others[unique]
+
+        starts = np.searchsorted(owners, ns, side='left')
+        lengths = np.searchsorted(owners, ns, side='right') - starts
+        offsets = np.zeros(len(ns) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return offsets, others[self.gather_ranges(starts, lengths)]
+
+    def gather_ranges(self, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """
+            Concatenates `[starts[i], starts[i] + lengths[i])` ranges without a Python loop.
+        """
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64)
+        offsets = np.cumsum(lengths) - lengths
+        return np.repeat(starts - offsets, lengths) + np.arange(total)
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
 import json
+import threading
 
 import sqlalchemy as sa
 from sqlalchemy.orm import sessionmaker
@@ -11,6 +12,7 @@ from sqlalchemy import or_, and_
 from sqlalchemy_utils import create_database, database_exists
 from sqlalchemy import text
 from sqlalchemy import Index, Table
+from sqlalchemy import select, literal, union, union_all, exists
 
 from PyStorageGraph.BaseAPI import *
 from PyStorageHelpers import *
@@ -51,12 +53,6 @@ class EdgeSQL(DeclarativeSQL, Edge):
         Edge.__init__(self, *args, **kwargs)
 
 
-index_first = Index('index_first', EdgeSQL.first, unique=False)
-index_second = Index('index_second', EdgeSQL.second, unique=False)
-index_label = Index('index_label', EdgeSQL.label, unique=False)
-index_directed = Index('index_directed', EdgeSQL.is_directed, unique=False)
-
-
 class EdgeNewSQL(DeclarativeSQL, Edge):
     __tablename__ = 'new_edges'
     _id = Column(BigInteger, primary_key=True)
@@ -112,11 +108,18 @@ class BaseSQL(BaseAPI):
         in case of in-memory SQLite instance.
         Replacing it with `bulk_insert_mappings()` reduced import time by 70%!
         https://docs.sqlalchemy.org/en/13/faq/performance.html#result-fetching-slowness-core
+        That's why hot read paths execute SQLAlchemy Core `select()` statements
+        and return plain `Edge` and `Node` objects, bypassing the identity map.
+        Those aren't attached to any session, so modify them via `add()`.
     """
     __is_concurrent__ = True
     __max_batch_size__ = 1000000
     __edge_type__ = EdgeSQL
     __in_memory__ = False
+    __accepts_edge_batches__ = True
+    # The number of bound parameters allowed in a single statement.
+    # SQLite before 3.32 has the lowest limit of all supported dialects.
+    __max_query_params__ = 999
 
     def __init__(self, url='sqlite:///:memory:', **kwargs):
         BaseAPI.__init__(self, **kwargs)
@@ -126,6 +129,9 @@ class BaseSQL(BaseAPI):
         self.engine = sa.create_engine(url)
         DeclarativeSQL.metadata.create_all(self.engine)
         self.session_maker = sessionmaker(bind=self.engine)
+        # Session pinned by `transaction()` for the current thread.
+        self.pinned = threading.local()
+        self.create_indexes()
 
 # region Metadata
 
@@ -140,17 +146,13 @@ class BaseSQL(BaseAPI):
         return GraphDegree(*result)
 
     def reduce_edges(self, u=None, v=None, key=None) -> GraphDegree:
-        result = (0, 0)
-        with self.get_session() as s:
-            q = s.query(
-                func.count(EdgeSQL.weight).label("count"),
-                func.sum(EdgeSQL.weight).label("sum"),
-            )
-            q = self.filter_edges_members(q, u, v)
-            q = self.filter_edges_label(q, key)
-            result = q.first()
-
-        return GraphDegree(*result)
+        q = select([
+            func.count(EdgeSQL.weight).label("count"),
+            func.sum(EdgeSQL.weight).label("sum"),
+        ])
+        q = self.filter_edges_members(q, u, v)
+        q = self.filter_edges_label(q, key)
+        return GraphDegree(*self.fetch_rows(q)[0])
 
     def biggest_edge_id(self) -> int:
         result = 0
@@ -167,22 +169,17 @@ class BaseSQL(BaseAPI):
 # region Bulk Reads
 
     @property
-    def nodes(self) -> Sequence[Node]:
-        with self.get_session() as s:
-            return s.query(NodeSQL).all()
-        return []
+    def nodes(self) -> Generator[Node, None, None]:
+        return map(self.node_from_row, self.stream_rows(select(self.node_columns)))
 
     @property
-    def edges(self) -> Sequence[Edge]:
-        with self.get_session() as s:
-            return s.query(EdgeSQL).all()
-        return []
+    def edges(self) -> Generator[Edge, None, None]:
+        return map(self.edge_from_row, self.stream_rows(select(self.edge_columns)))
 
     @property
-    def out_edges(self) -> Sequence[Edge]:
-        with self.get_session() as s:
-            return s.query(EdgeSQL).filter(EdgeSQL.is_directed == True).all()
-        return []
+    def out_edges(self) -> Generator[Edge, None, None]:
+        q = select(self.edge_columns).where(EdgeSQL.is_directed == True)
+        return map(self.edge_from_row, self.stream_rows(q))
 
     @property
     def mentioned_nodes_ids(self) -> Sequence[int]:
@@ -197,32 +194,198 @@ class BaseSQL(BaseAPI):
 
     def has_node(self, n) -> Optional[Node]:
         n = self.make_node_id(n)
-        with self.get_session() as s:
-            return s.query(NodeSQL).filter(NodeSQL._id == n).first()
-        return None
+        q = select(self.node_columns).where(NodeSQL._id == n).limit(1)
+        rows = self.fetch_rows(q)
+        return self.node_from_row(rows[0]) if len(rows) else None
 
     def has_edge(self, u, v, key=None) -> Sequence[Edge]:
-        with self.get_session() as s:
-            q = s.query(EdgeSQL)
-            q = self.filter_edges_members(q, u, v)
-            q = self.filter_edges_label(q, key)
-            return q.all()
-        return []
+        q = select(self.edge_columns)
+        q = self.filter_edges_members(q, u, v)
+        q = self.filter_edges_label(q, key)
+        return [self.edge_from_row(row) for row in self.fetch_rows(q)]
+
+    def neighbors(self, n) -> Set[int]:
+        """
+            Selects only the IDs of opposite members with a `UNION` of two
+            queries, each of which can be answered from a covering index.
+        """
+        n = self.make_node_id(n)
+        q = union(
+            select([EdgeSQL.second.label('_id')]).where(EdgeSQL.first == n),
+            select([EdgeSQL.first.label('_id')]).where(EdgeSQL.second == n),
+        )
+        return self.fetch_ids(q, n)
+
+    def successors(self, n) -> Set[int]:
+        if not self.directed:
+            return self.neighbors(n)
+        n = self.make_node_id(n)
+        q = select([EdgeSQL.second]).where(EdgeSQL.first == n).distinct()
+        return self.fetch_ids(q, n)
+
+    def predecessors(self, n) -> Set[int]:
+        if not self.directed:
+            return self.neighbors(n)
+        n = self.make_node_id(n)
+        q = select([EdgeSQL.first]).where(EdgeSQL.second == n).distinct()
+        return self.fetch_ids(q, n)
 
     def neighbors_of_group(self, vs: Sequence[int]) -> Set[int]:
         result = set()
-        with self.get_session() as s:
-            edges = s.query(EdgeSQL).filter(or_(
-                EdgeSQL.first.in_(vs),
-                EdgeSQL.second.in_(vs),
-            )).all()
-            for e in edges:
-                if (e.first not in vs):
-                    result.add(e.first)
-                elif (e.second not in vs):
-                    result.add(e.second)
+        vs = set(vs)
+        for chunk in chunks(list(vs), type(self).__max_query_params__ // 2):
+            q = select([EdgeSQL.first, EdgeSQL.second]).where(or_(
+                EdgeSQL.first.in_(chunk),
+                EdgeSQL.second.in_(chunk),
+            ))
+            for first, second in self.fetch_rows(q):
+                if (first not in vs):
+                    result.add(first)
+                elif (second not in vs):
+                    result.add(second)
         return result
 
+    def neighbors_of_neighbors(self, v: int, include_related=False) -> Set[int]:
+        depths = self.bfs(v, 2)
+        min_depth = 1 if include_related else 2
+        return {n for n, depth in depths.items() if depth >= min_depth}
+
+    def bfs(self, v: int, max_depth: int) -> Dict[int, int]:
+        """
+            Expands the neighborhood inside the DB with a single `WITH RECURSIVE`
+            query over `(_id, depth)` pairs, bounded by `max_depth`.
+            The seed selects the neighbors of `v` straight from the edges table,
+            so the columns are typed by it and no dialect-specific `CAST` is needed.
+            `UNION` deduplicates `(_id, depth)` pairs, so every level of the
+            expansion holds every node at most once, and the shortest
+            depth is picked with `MIN(depth)`.
+            CAUTION: The recursive part can't reference the already reached nodes,
+            so nodes reached early are expanded again on the following levels.
+            SQLite before 3.8.3, MySQL before 8.0 and MariaDB before 10.2.2 lack
+            recursive CTEs and fall back to `BaseAPI.bfs`, one query per level.
+        """
+        v = self.make_node_id(v)
+        if max_depth <= 0:
+            return {v: 0}
+        if not self.supports_recursive_queries():
+            return super().bfs(v, max_depth)
+        task = text(f'''
+            WITH RECURSIVE reached(_id, depth) AS (
+                SELECT
+                    CASE WHEN e.first = :v THEN e.second ELSE e.first END,
+                    1
+                FROM {EdgeSQL.__tablename__} e
+                WHERE e.first = :v OR e.second = :v
+                UNION
+                SELECT
+                    CASE WHEN e.first = r._id THEN e.second ELSE e.first END,
+                    r.depth + 1
+                FROM reached r
+                JOIN {EdgeSQL.__tablename__} e
+                ON e.first = r._id OR e.second = r._id
+                WHERE r.depth < :max_depth
+            )
+            SELECT _id, MIN(depth) FROM reached GROUP BY _id;
+        ''').bindparams(v=v, max_depth=max_depth)
+        depths = {v: 0}
+        for n, depth in self.fetch_rows(task):
+            depths.setdefault(n, depth)
+        return depths
+
+    def supports_recursive_queries(self) -> bool:
+        dialect = self.engine.dialect
+        version = tuple(dialect.server_version_info or ())
+        if dialect.name == 'sqlite':
+            return version >= (3, 8, 3)
+        if dialect.name == 'mysql':
+            is_mariadb = getattr(dialect, '_is_mariadb', False)
+            return version >= ((10, 2, 2) if is_mariadb else (8, 0))
+        return True
+
+# region Batch Reads
+
+    def reduce_edges_many(self, us, vs, key=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Merges grouped aggregations over all pairs into `UNION ALL` queries,
+            so the whole batch takes as few round trips, as `__max_query_params__` allows.
+        """
+        us, vs = self.make_node_ids_pairs(us, vs)
+        split = self.split_pairs(us, vs)
+        key = self.make_label(key)
+
+        def make_select(kind: int, a, b):
+            q = select([
+                literal(kind).label('kind'),
+                a.label('a'),
+                b.label('b'),
+                func.count(EdgeSQL.weight).label('count'),
+                func.sum(EdgeSQL.weight).label('sum'),
+            ])
+            if key >= 0:
+                q = q.where(EdgeSQL.label == key)
+            return q
+
+        no_id = literal(-1)
+        # Every part also binds its literals and the label.
+        max_ids = type(self).__max_query_params__ - 8
+        parts = []
+        if len(split['pair_us']):
+            pairs = np.unique(np.stack(
+                (split['pair_us'], split['pair_vs']), axis=1), axis=0)
+            for start in range(0, len(pairs), max_ids // 2):
+                chunk = pairs[start:start + max_ids // 2]
+                pair_us = np.unique(chunk[:, 0]).tolist()
+                pair_vs = np.unique(chunk[:, 1]).tolist()
+                parts.append((len(pair_us) + len(pair_vs), make_select(0, EdgeSQL.first, EdgeSQL.second).where(and_(
+                    EdgeSQL.first.in_(pair_us),
+                    EdgeSQL.second.in_(pair_vs),
+                )).group_by(EdgeSQL.first, EdgeSQL.second)))
+        for chunk in chunks(split['outs'].tolist(), max_ids):
+            parts.append((len(chunk), make_select(1, EdgeSQL.first, no_id).where(
+                EdgeSQL.first.in_(chunk),
+            ).group_by(EdgeSQL.first)))
+        for chunk in chunks(split['ins'].tolist(), max_ids):
+            parts.append((len(chunk), make_select(2, no_id, EdgeSQL.second).where(
+                EdgeSQL.second.in_(chunk),
+            ).group_by(EdgeSQL.second)))
+        for chunk in chunks(split['loops'].tolist(), max_ids):
+            parts.append((len(chunk), make_select(3, EdgeSQL.first, EdgeSQL.second).where(and_(
+                EdgeSQL.first.in_(chunk),
+                EdgeSQL.first == EdgeSQL.second,
+            )).group_by(EdgeSQL.first, EdgeSQL.second)))
+        if split['total']:
+            parts.append((0, make_select(4, no_id, no_id)))
+
+        groups = [dict() for _ in range(5)]
+        with self.get_session() as s:
+            for q in self.union_parts(parts):
+                for kind, a, b, c, w in s.execute(q):
+                    member = (a, b) if kind == 0 else (b if kind == 2 else a)
+                    groups[kind][member] = (c, w or 0)
+        return self.assemble_reduced(
+            us, vs,
+            pairs=groups[0],
+            outs=groups[1],
+            ins=groups[2],
+            loops=groups[3],
+            total=groups[4].get(-1, (0, 0)),
+        )
+
+    def neighbors_many(self, ns) -> Tuple[np.ndarray, np.ndarray]:
+        ns = self.make_node_ids_array(ns)
+        if len(ns) == 0:
+            return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        rows = []
+        # Every ID is mentioned twice in the query.
+        for chunk in chunks(np.unique(ns).tolist(), type(self).__max_query_params__ // 2):
+            q = select([EdgeSQL.first, EdgeSQL.second]).where(or_(
+                EdgeSQL.first.in_(chunk),
+                EdgeSQL.second.in_(chunk),
+            )).distinct()
+            rows.extend(self.fetch_rows(q))
+        members = np.asarray(rows, dtype=np.int64).reshape((-1, 2))
+        return self.group_neighbors(ns, members[:, 0], members[:, 1])
+
 # region Random Writes
 
     def add(self, obj, upsert=True) -> int:
@@ -231,13 +394,22 @@ class BaseSQL(BaseAPI):
                 s.merge(obj)
             return 1
 
+        if isinstance(obj, EdgeBatch):
+            return self.add_batch(obj, upsert=upsert)
+
         if not isinstance(obj, collections.Sequence):
             obj = [obj]
 
         # We are dealing with a collection of `Node`s or `Edge`s.
+        target_class = EdgeSQL if is_sequence_of(obj, Edge) else NodeSQL
+        if upsert and self.upsert_statement(target_class.__table__) is not None:
+            return self.upsert_rows(
+                target_class.__table__,
+                [self.row_of_object(o, target_class) for o in obj],
+            )
+
         all_ids = [o._id for o in obj]
         new_dicts = {o._id: o.__dict__ for o in obj}
-        target_class = EdgeSQL if is_sequence_of(obj, Edge) else NodeSQL
         with self.get_session() as s:
             # Only merge those entries which already exist in the database
             if upsert:
@@ -258,6 +430,31 @@ class BaseSQL(BaseAPI):
 
         return super().add(obj)
 
+    def add_batch(self, batch: EdgeBatch, upsert=True) -> int:
+        """
+            Imports columns of the `EdgeBatch` without constructing ORM objects.
+        """
+        new_dicts = batch.to_dicts()
+        if upsert and self.upsert_statement(EdgeSQL.__table__) is not None:
+            return self.upsert_rows(EdgeSQL.__table__, new_dicts)
+
+        with self.get_session() as s:
+            if upsert:
+                existing_ids = s.query(EdgeSQL._id).filter(
+                    EdgeSQL._id.in_(batch._id.tolist())).all()
+                existing_ids = {row[0] for row in existing_ids}
+                if len(existing_ids):
+                    s.bulk_update_mappings(
+                        EdgeSQL,
+                        [d for d in new_dicts if d['_id'] in existing_ids],
+                    )
+                    new_dicts = [
+                        d for d in new_dicts if d['_id'] not in existing_ids]
+            # Core `executemany` skips even the bulk mapping machinery.
+            if len(new_dicts):
+                s.execute(EdgeSQL.__table__.insert(), new_dicts)
+        return len(batch)
+
     def remove(self, obj) -> int:
         with self.get_session() as s:
             # Edge
@@ -280,9 +477,52 @@ class BaseSQL(BaseAPI):
                 )).delete() + s.query(NodeSQL).filter_by(
                     _id=obj._id
                 ).delete()
+            # Many edges.
+            elif is_sequence_of(obj, Edge):
+                ids = [e._id for e in obj if e._id >= 0]
+                result = 0
+                for chunk in chunks(ids, type(self).__max_query_params__):
+                    result += s.execute(EdgeSQL.__table__.delete().where(
+                        EdgeSQL._id.in_(chunk))).rowcount
+                without_ids = [e for e in obj if e._id < 0]
+                if len(without_ids):
+                    result += self.remove_by_members(s, without_ids)
+                return result
+            # Many nodes with all of their edges.
+            elif is_sequence_of(obj, Node):
+                ids = [n._id for n in obj]
+                result = 0
+                # Every ID is mentioned twice in the edges query.
+                for chunk in chunks(ids, type(self).__max_query_params__ // 2):
+                    result += s.execute(EdgeSQL.__table__.delete().where(or_(
+                        EdgeSQL.first.in_(chunk),
+                        EdgeSQL.second.in_(chunk),
+                    ))).rowcount
+                    result += s.execute(NodeSQL.__table__.delete().where(
+                        NodeSQL._id.in_(chunk))).rowcount
+                return result
 
         return super().remove(obj)
 
+    def remove_by_members(self, s, es: Sequence[Edge]) -> int:
+        """
+            Deletes edges without IDs with one `DELETE` per chunk of members,
+            instead of issuing a separate `DELETE` for every edge.
+            The conditions are inlined into the statement, so concurrent
+            imports that stage rows in `new_edges` aren't affected.
+        """
+        members = list(dict.fromkeys(
+            (e.first, e.second, bool(e.is_directed)) for e in es))
+        result = 0
+        for chunk in chunks(members, type(self).__max_query_params__ // 3):
+            matches = or_(*[and_(
+                EdgeSQL.first == first,
+                EdgeSQL.second == second,
+                EdgeSQL.is_directed == is_directed,
+            ) for first, second, is_directed in chunk])
+            result += s.execute(EdgeSQL.__table__.delete().where(matches)).rowcount
+        return result
+
     def remove_node(self, n) -> int:
         return self.remove(self.make_node(n))
 
@@ -311,6 +551,9 @@ class BaseSQL(BaseAPI):
             # Build the new table.
             chunk_len = type(self).__max_batch_size__
             for objs in chunks(stream, chunk_len):
+                if isinstance(objs, EdgeBatch):
+                    s.execute(EdgeNewSQL.__table__.insert(), objs.to_dicts())
+                    continue
                 s.bulk_insert_mappings(
                     EdgeNewSQL,
                     [o.__dict__ for o in objs],
@@ -326,6 +569,31 @@ class BaseSQL(BaseAPI):
         result = self.number_of_edges() - cnt
         return result
 
+# region Indexes
+
+    def list_indexes(self) -> Dict[str, Tuple[str, ...]]:
+        indexes = sa.inspect(self.engine).get_indexes(EdgeSQL.__tablename__)
+        return {i['name']: tuple(i['column_names']) for i in indexes}
+
+    def create_index(self, name: str, fields: Sequence[str]) -> bool:
+        self.make_index(name, fields).create(self.engine)
+        return True
+
+    def drop_index(self, name: str) -> bool:
+        fields = self.list_indexes().get(name, None)
+        if fields is None:
+            return False
+        self.make_index(name, fields).drop(self.engine)
+        return True
+
+    def make_index(self, name: str, fields: Sequence[str]) -> Index:
+        # Indexes bound to the table would be created with it in every
+        # other instance, so we detach it right after construction.
+        table = EdgeSQL.__table__
+        index = Index(name, *[table.c[f] for f in fields], unique=False)
+        table.indexes.discard(index)
+        return index
+
 # region Helpers
 
     def insert_table(self, source_name: str):
@@ -358,8 +626,190 @@ class BaseSQL(BaseAPI):
         with self.get_session() as s:
             s.execute(text(f'DELETE FROM {table_name};'))
 
+    def upsert_statement(self, table: Table):
+        """
+            Returns a statement, that inserts a row or updates
+            all of its columns if the `_id` is already present.
+            Dialects without native upserts return `None`, falling back
+            to selecting existing rows and merging them one by one.
+            SQLAlchemy 1.3 has no construct for SQLite, so the text is built here.
+            https://www.sqlite.org/lang_UPSERT.html
+        """
+        if self.engine.dialect.name != 'sqlite':
+            return None
+        names = [c.name for c in table.columns]
+        updates = [f'{n}=excluded.{n}' for n in names if n != '_id']
+        return text(f'''
+            INSERT INTO {table.name} ({', '.join(names)})
+            VALUES ({', '.join(':' + n for n in names)})
+            ON CONFLICT (_id) DO UPDATE SET {', '.join(updates)};
+        ''')
+
+    def upsert_rows(self, table: Table, rows: Sequence[dict]) -> int:
+        """
+            Returns the number of distinct rows written, on every dialect.
+        """
+        rows = self.rows_to_upsert(table, rows)
+        if len(rows) == 0:
+            return 0
+        with self.get_session() as s:
+            s.execute(self.upsert_statement(table), rows)
+        return len(rows)
+
+    def rows_to_upsert(self, table: Table, rows: Sequence[dict]) -> List[dict]:
+        """
+            Reduces duplicate `_id`s to their last occurrence, as multi-row
+            upserts can't touch the same row twice in one statement and
+            dialects would otherwise disagree on the result.
+            Every row gets every column to be used in `executemany`.
+        """
+        names = [c.name for c in table.columns]
+        last_rows = dict()
+        for i, row in enumerate(rows):
+            _id = row.get('_id', None)
+            last_rows[i if _id is None else ('_id', _id)] = row
+        return [{n: row.get(n, None) for n in names} for row in last_rows.values()]
+
+    def row_of_object(self, o, target_class) -> dict:
+        row = {
+            c.name: getattr(o, c.name, None)
+            for c in target_class.__table__.columns
+            if c.name != 'payload_json'
+        }
+        payload_json = getattr(o, 'payload_json', None)
+        payload = getattr(o, 'payload', None)
+        if payload_json is None and payload:
+            payload_json = json.dumps(payload)
+        row['payload_json'] = payload_json
+        return row
+
+    @property
+    def edge_columns(self) -> list:
+        return [
+            EdgeSQL._id, EdgeSQL.first, EdgeSQL.second,
+            EdgeSQL.weight, EdgeSQL.label, EdgeSQL.is_directed,
+            EdgeSQL.payload_json,
+        ]
+
+    @property
+    def node_columns(self) -> list:
+        return [NodeSQL._id, NodeSQL.weight, NodeSQL.label, NodeSQL.payload_json]
+
+    def edge_from_row(self, row) -> Edge:
+        _id, first, second, weight, label, is_directed, payload_json = row
+        return Edge(
+            _id=_id,
+            first=first,
+            second=second,
+            weight=weight,
+            label=label,
+            is_directed=is_directed,
+            payload=json.loads(payload_json) if payload_json else {},
+        )
+
+    def node_from_row(self, row) -> Node:
+        _id, weight, label, payload_json = row
+        return Node(
+            _id=_id,
+            weight=weight,
+            label=label,
+            payload=json.loads(payload_json) if payload_json else {},
+        )
+
+    def fetch_rows(self, q) -> list:
+        """
+            Executes a Core statement, returning raw tuples
+            without populating the ORM identity map.
+        """
+        with self.get_connection() as conn:
+            return conn.execute(q).fetchall()
+
+    def union_parts(self, parts: Sequence[Tuple[int, object]]) -> Generator[object, None, None]:
+        """
+            Packs `(cnt_params, select)` parts into `UNION ALL` statements,
+            each binding no more than `__max_query_params__` parameters.
+        """
+        max_params = type(self).__max_query_params__
+        pending = []
+        cnt_pending = 0
+        for cnt_params, q in parts:
+            cnt_params += 8
+            if len(pending) and cnt_pending + cnt_params > max_params:
+                yield pending[0] if len(pending) == 1 else union_all(*pending)
+                pending = []
+                cnt_pending = 0
+            pending.append(q)
+            cnt_pending += cnt_params
+        if len(pending):
+            yield pending[0] if len(pending) == 1 else union_all(*pending)
+
+    def fetch_ids(self, q, excluded: int) -> Set[int]:
+        result = {row[0] for row in self.fetch_rows(q)}
+        result.discard(excluded)
+        return result
+
+    def stream_rows(self, q) -> Generator[tuple, None, None]:
+        """
+            Yields results of the query in batches of `__fetch_batch_size__`,
+            so the memory consumption stays constant during full scans.
+            With `stream_results` SQLAlchemy requests server-side cursors
+            from the PostgreSQL and MySQL drivers.
+            https://docs.sqlalchemy.org/en/13/core/connections.html#sqlalchemy.engine.Connection.execution_options.params.stream_results
+        """
+        chunk_len = type(self).__fetch_batch_size__
+        with self.get_connection() as conn:
+            result = conn.execution_options(stream_results=True).execute(q)
+            while True:
+                rows = result.fetchmany(chunk_len)
+                if len(rows) == 0:
+                    break
+                yield from rows
+
+    @contextmanager
+    def transaction(self):
+        """
+            Pins a single session to the current thread, so every call
+            within the block reuses its connection and commits once at the end.
+
+            CAUTION:
+            Bulk loaders, that work with raw DB-API connections, like `COPY`
+            or `LOAD DATA`, commit on their own and shouldn't be used inside.
+        """
+        if getattr(self.pinned, 'session', None) is not None:
+            yield self
+            return
+
+        session = self.session_maker()
+        session.expire_on_commit = False
+        self.pinned.session = session
+        try:
+            yield self
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            self.pinned.session = None
+            session.close()
+
+    @contextmanager
+    def get_connection(self):
+        session = getattr(self.pinned, 'session', None)
+        if session is None:
+            with self.engine.connect() as conn:
+                yield conn
+        else:
+            # Core statements must observe pending ORM changes.
+            session.flush()
+            yield session.connection()
+
     @contextmanager
     def get_session(self):
+        pinned = getattr(self.pinned, 'session', None)
+        if pinned is not None:
+            yield pinned
+            return
+
         session = self.session_maker()
         session.expire_on_commit = False
         try:
@@ -373,7 +823,7 @@ class BaseSQL(BaseAPI):
             session.close()
 
     def filter_edges_containing(self, q, n):
-        return q.filter(or_(
+        return q.where(or_(
             EdgeSQL.first == n,
             EdgeSQL.second == n,
         ))
@@ -387,15 +837,15 @@ class BaseSQL(BaseAPI):
             if not self.directed:
                 return self.filter_edges_containing(q, max(u, v))
             elif u < 0:
-                return q.filter(EdgeSQL.second == v)
+                return q.where(EdgeSQL.second == v)
             elif v < 0:
-                return q.filter(EdgeSQL.first == u)
+                return q.where(EdgeSQL.first == u)
         else:
             if self.directed:
                 if u == v:
                     return self.filter_edges_containing(q, u)
                 else:
-                    return q.filter(and_(
+                    return q.where(and_(
                         EdgeSQL.first == u,
                         EdgeSQL.second == v,
                     ))
@@ -403,7 +853,7 @@ class BaseSQL(BaseAPI):
                 if u == v:
                     return self.filter_edges_containing(q, u)
                 else:
-                    return q.filter(or_(
+                    return q.where(or_(
                         and_(
                             EdgeSQL.first == v,
                             EdgeSQL.second == u,
@@ -418,4 +868,4 @@ class BaseSQL(BaseAPI):
         key = self.make_label(key)
         if key < 0:
             return q
-        return q.filter(EdgeSQL.label == key)
+        return q.where(EdgeSQL.label == key)
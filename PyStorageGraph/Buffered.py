@@ -0,0 +1,302 @@
+from typing import List, Optional, Dict, Generator, Set, Tuple, Sequence
+from contextlib import contextmanager
+import collections
+import threading
+from time import time
+
+from PyStorageGraph.BaseAPI import BaseAPI
+from PyStorageHelpers import *
+
+
+class BufferedGraph(BaseAPI):
+    """
+        Write-behind wrapper, that accumulates single `Edge` and `Node`
+        additions and removals and passes them to the wrapped backend
+        in batches. The buffer is flushed once it reaches `max_batch_size`,
+        once the oldest buffered write is `max_delay_seconds` old,
+        on explicit `flush()` and before any read, so reads always
+        observe previous writes.
+
+        Writes are coalesced by `_id`, so only the last operation
+        on every object reaches the DB. An addition followed by a removal
+        is reduced to just the removal, instead of cancelling both,
+        as the object may have existed before the addition.
+
+        CAUTION:
+        The deadline is enforced by a background timer only for backends
+        marked with `__is_concurrent__`. Others can't be used from another thread,
+        so the deadline is checked on the next call to the wrapper.
+
+        CAUTION:
+        Edges without IDs and nodes can't be coalesced, so removing them
+        flushes the buffer and is forwarded immediately.
+        Counts returned by `add` and `remove` are optimistic,
+        while `flush` returns the counts reported by the backend.
+    """
+    __max_batch_size__ = 100
+    __is_concurrent__ = True
+    __edge_type__ = Edge
+    __node_type__ = Node
+    __in_memory__ = False
+
+    def __init__(self, graph: BaseAPI, max_batch_size: int = None, max_delay_seconds: float = 1.0, **kwargs):
+        BaseAPI.__init__(
+            self,
+            directed=graph.directed,
+            weighted=graph.weighted,
+            multigraph=graph.multigraph,
+        )
+        self.graph = graph
+        self.max_batch_size = max_batch_size or type(graph).__max_batch_size__
+        self.max_delay_seconds = max_delay_seconds
+        self.lock = threading.RLock()
+        self.timer = None
+        # Maps `(type, _id)` to the last `(is_addition, object, upsert)` requested.
+        self.pending = collections.OrderedDict()
+        self.pending_since = None
+        self.count_flushes = 0
+        self.count_coalesced = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# region Metadata
+
+    def reduce_nodes(self) -> GraphDegree:
+        self.flush()
+        return self.graph.reduce_nodes()
+
+    def reduce_edges(self, u=None, v=None, key=None) -> GraphDegree:
+        self.flush()
+        return self.graph.reduce_edges(u, v, key)
+
+    def biggest_edge_id(self) -> int:
+        self.flush()
+        return self.graph.biggest_edge_id()
+
+    def number_of_nodes(self) -> int:
+        self.flush()
+        return self.graph.number_of_nodes()
+
+# region Bulk Reads
+
+    @property
+    def nodes(self) -> Sequence[Node]:
+        self.flush()
+        return self.graph.nodes
+
+    @property
+    def edges(self) -> Sequence[Edge]:
+        self.flush()
+        return self.graph.edges
+
+    @property
+    def out_edges(self) -> Sequence[Edge]:
+        self.flush()
+        return self.graph.out_edges
+
+    @property
+    def in_edges(self) -> Sequence[Edge]:
+        self.flush()
+        return self.graph.in_edges
+
+    @property
+    def mentioned_nodes_ids(self) -> Sequence[int]:
+        self.flush()
+        return self.graph.mentioned_nodes_ids
+
+# region Random Reads
+
+    def has_node(self, n) -> Optional[Node]:
+        self.flush()
+        return self.graph.has_node(n)
+
+    def has_edge(self, u, v, key=None) -> Sequence[Edge]:
+        self.flush()
+        return self.graph.has_edge(u, v, key)
+
+    def neighbors(self, n) -> Sequence[int]:
+        self.flush()
+        return self.graph.neighbors(n)
+
+    def successors(self, n) -> Sequence[int]:
+        self.flush()
+        return self.graph.successors(n)
+
+    def predecessors(self, n) -> Sequence[int]:
+        self.flush()
+        return self.graph.predecessors(n)
+
+    def neighbors_of_group(self, vs: Sequence[int]) -> Set[int]:
+        self.flush()
+        return self.graph.neighbors_of_group(vs)
+
+    def neighbors_of_neighbors(self, v: int, include_related=False) -> Set[int]:
+        self.flush()
+        return self.graph.neighbors_of_neighbors(v, include_related=include_related)
+
+    def bfs(self, v: int, max_depth: int) -> Dict[int, int]:
+        self.flush()
+        return self.graph.bfs(v, max_depth)
+
+    def k_hop_neighbors(self, v: int, k: int) -> Set[int]:
+        self.flush()
+        return self.graph.k_hop_neighbors(v, k)
+
+# region Batch Reads
+
+    def reduce_edges_many(self, us, vs, key=None):
+        self.flush()
+        return self.graph.reduce_edges_many(us, vs, key)
+
+    def neighbors_many(self, ns):
+        self.flush()
+        return self.graph.neighbors_many(ns)
+
+    def has_nodes(self, ns):
+        self.flush()
+        return self.graph.has_nodes(ns)
+
+# region Random Writes
+
+    def add(self, obj, upsert=True) -> int:
+        if isinstance(obj, Edge) or isinstance(obj, Node):
+            self.buffer(obj, is_addition=True, upsert=upsert)
+            return 1
+        elif isinstance(obj, EdgeBatch):
+            # Columnar batches are already big enough to be passed as is.
+            with self.lock:
+                self.flush()
+                return self.graph.add(obj, upsert=upsert)
+        return super().add(obj, upsert=upsert)
+
+    def remove(self, obj) -> int:
+        if isinstance(obj, Edge) and obj._id >= 0:
+            self.buffer(obj, is_addition=False)
+            return 1
+        elif isinstance(obj, (Edge, Node, EdgeBatch)):
+            with self.lock:
+                self.flush()
+                return self.graph.remove(obj)
+        return super().remove(obj)
+
+    def remove_node(self, n) -> int:
+        with self.lock:
+            self.flush()
+            return self.graph.remove_node(n)
+
+    def add_missing_nodes(self) -> int:
+        self.flush()
+        return self.graph.add_missing_nodes()
+
+# region Bulk Writes
+
+    def add_stream(self, stream, upsert=True) -> int:
+        self.flush()
+        return self.graph.add_stream(stream, upsert=upsert)
+
+    def clear_edges(self):
+        with self.lock:
+            self.drop_pending(lambda key: key[0] is Edge)
+            return self.graph.clear_edges()
+
+    def clear(self):
+        with self.lock:
+            self.drop_pending(lambda key: True)
+            return self.graph.clear()
+
+    def flush(self) -> int:
+        """
+            Passes all buffered writes to the wrapped graph,
+            grouping them into as few bulk operations as possible.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if len(self.pending) == 0:
+                return 0
+
+            groups = collections.defaultdict(list)
+            for key, (is_addition, obj, upsert) in self.pending.items():
+                groups[(key[0], is_addition, upsert)].append(obj)
+            self.pending = collections.OrderedDict()
+            self.pending_since = None
+            self.count_flushes += 1
+
+            # Removals go first, as they can't affect objects, that are added.
+            result = 0
+            for (target_type, is_addition, upsert), objs in sorted(
+                    groups.items(), key=lambda g: g[0][1]):
+                if is_addition:
+                    result += self.graph.add(objs, upsert=upsert)
+                else:
+                    result += self.graph.remove(objs)
+            return result
+
+    def close(self):
+        self.flush()
+
+# region Transactions
+
+    @contextmanager
+    def transaction(self):
+        """
+            Flushes the buffer into the wrapped graph before the transaction commits.
+            Writes buffered within a failed transaction are dropped.
+        """
+        with self.lock:
+            self.flush()
+            with self.graph.transaction():
+                try:
+                    yield self
+                    self.flush()
+                except Exception as e:
+                    self.drop_pending(lambda key: True)
+                    raise e
+
+# region Indexes
+
+    def list_indexes(self) -> Dict[str, Tuple[str, ...]]:
+        return self.graph.list_indexes()
+
+    def create_index(self, name: str, fields: Sequence[str]) -> bool:
+        return self.graph.create_index(name, fields)
+
+    def drop_index(self, name: str) -> bool:
+        return self.graph.drop_index(name)
+
+# region Helpers
+
+    def buffer(self, obj, is_addition: bool, upsert=True):
+        target_type = Edge if isinstance(obj, Edge) else Node
+        # Objects without IDs can't be coalesced with each other.
+        key = (target_type, obj._id) if obj._id >= 0 else (target_type, None, id(obj))
+        with self.lock:
+            if key in self.pending:
+                self.pending.pop(key)
+                self.count_coalesced += 1
+            self.pending[key] = (is_addition, obj, upsert)
+
+            now = time()
+            if self.pending_since is None:
+                self.pending_since = now
+            is_late = self.max_delay_seconds is not None and \
+                (now - self.pending_since) >= self.max_delay_seconds
+            if len(self.pending) >= self.max_batch_size or is_late:
+                self.flush()
+            elif self.timer is None and self.max_delay_seconds is not None and \
+                    type(self.graph).__is_concurrent__:
+                self.timer = threading.Timer(self.max_delay_seconds, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def drop_pending(self, predicate):
+        with self.lock:
+            for key in [k for k in self.pending.keys() if predicate(k)]:
+                self.pending.pop(key)
+            if len(self.pending) == 0:
+                self.pending_since = None
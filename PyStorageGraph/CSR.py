@@ -0,0 +1,739 @@
+from typing import List, Optional, Dict, Generator, Set, Tuple, Sequence
+import os
+import shutil
+import dataclasses
+
+import numpy as np
+
+from PyStorageGraph.BaseAPI import BaseAPI
+from PyStorageHelpers import *
+
+
+class CSRMem(BaseAPI):
+    """
+        In-memory graph stored in Compressed-Sparse-Row format using NumPy arrays.
+        Forward adjacency is kept in `indptr`, `indices`, `weights`, `labels` and `edge_ids`,
+        all sorted by `(first, second)`. Reverse adjacency is kept in `in_indptr`, `in_indices`
+        and `in_positions`, where the latter points back into the forward arrays,
+        so the reverse side doesn't duplicate the edge attributes.
+        Rows are addressed through the sorted `node_ids` array with a binary search,
+        so arbitrary (hashed) node IDs are supported.
+
+        Every lookup is answered with array slices instead of ORM objects.
+        With `int64` IDs, `float32` weights and `int32` labels a graph takes ~41 bytes per edge,
+        so a 100M-edge graph fits in ~4 GB of RAM.
+
+        CAUTION:
+        CSR arrays are immutable, so writes are buffered and merged into the arrays
+        on the next read. Interleaving single writes with reads is expensive,
+        but batches of writes are merged in a single pass.
+
+        CAUTION:
+        Edge payloads are not preserved.
+        Nodes mentioned by edges are implicitly registered with unit weight,
+        so `add_missing_nodes` has nothing to do.
+    """
+    __is_concurrent__ = False
+    __max_batch_size__ = 5000000
+    __edge_type__ = Edge
+    __node_type__ = Node
+    __in_memory__ = True
+    __accepts_edge_batches__ = True
+
+    def __init__(self, url=None, **kwargs):
+        BaseAPI.__init__(self, **kwargs)
+        self.url = url
+        self.registered_nodes: Dict[int, Node] = dict()
+        self.pending_edges: Dict[int, Edge] = dict()
+        self.pending_removals: Set[int] = set()
+        self.load_arrays()
+
+# region Metadata
+
+    def reduce_nodes(self) -> GraphDegree:
+        self.compact()
+        registered_ids = np.fromiter(
+            self.registered_nodes.keys(),
+            dtype=np.int64,
+            count=len(self.registered_nodes),
+        )
+        cnt_implicit = len(np.setdiff1d(
+            self.node_ids, registered_ids, assume_unique=True))
+        weight_registered = sum(n.weight for n in self.registered_nodes.values())
+        return GraphDegree(
+            len(self.registered_nodes) + cnt_implicit,
+            weight_registered + cnt_implicit,
+        )
+
+    def reduce_edges(self, u=None, v=None, key=None) -> GraphDegree:
+        ps = self.positions_of_edges(u, v, key)
+        return GraphDegree(
+            len(ps),
+            float(self.weights[ps].sum(dtype=np.float64)),
+        )
+
+    def biggest_edge_id(self) -> int:
+        self.compact()
+        if len(self.edge_ids) == 0:
+            return 0
+        return int(self.edge_ids.max())
+
+    def add_missing_nodes(self) -> int:
+        return 0
+
+# region Bulk Reads
+
+    @property
+    def nodes(self) -> Sequence[Node]:
+        self.compact()
+        result = list(self.registered_nodes.values())
+        for _id in self.node_ids.tolist():
+            if _id not in self.registered_nodes:
+                result.append(self.make_node(_id))
+        return result
+
+    @property
+    def edges(self) -> Sequence[Edge]:
+        self.compact()
+        return self.edges_at(np.arange(len(self.edge_ids)))
+
+    @property
+    def out_edges(self) -> Sequence[Edge]:
+        self.compact()
+        return self.edges_at(np.flatnonzero(self.is_directed))
+
+    @property
+    def mentioned_nodes_ids(self) -> Sequence[int]:
+        self.compact()
+        return set(self.node_ids.tolist())
+
+# region Random Reads
+
+    def has_node(self, n) -> Optional[Node]:
+        n = self.make_node_id(n)
+        if n in self.registered_nodes:
+            return self.registered_nodes[n]
+        self.compact()
+        if self.row_of_node(n) < 0:
+            return None
+        return self.make_node(n)
+
+    def has_edge(self, u, v, key=None) -> Sequence[Edge]:
+        return self.edges_at(self.positions_of_edges(u, v, key))
+
+    def neighbors(self, n) -> Set[int]:
+        n = self.make_node_id(n)
+        self.compact()
+        row = self.row_of_node(n)
+        if row < 0:
+            return set()
+        ids = np.concatenate((
+            self.indices[self.indptr[row]:self.indptr[row+1]],
+            self.in_indices[self.in_indptr[row]:self.in_indptr[row+1]],
+        ))
+        result = set(np.unique(ids).tolist())
+        result.discard(n)
+        return result
+
+    def successors(self, n) -> Set[int]:
+        if not self.directed:
+            return self.neighbors(n)
+        n = self.make_node_id(n)
+        self.compact()
+        row = self.row_of_node(n)
+        if row < 0:
+            return set()
+        ids = self.indices[self.indptr[row]:self.indptr[row+1]]
+        result = set(np.unique(ids).tolist())
+        result.discard(n)
+        return result
+
+    def predecessors(self, n) -> Set[int]:
+        if not self.directed:
+            return self.neighbors(n)
+        n = self.make_node_id(n)
+        self.compact()
+        row = self.row_of_node(n)
+        if row < 0:
+            return set()
+        ids = self.in_indices[self.in_indptr[row]:self.in_indptr[row+1]]
+        result = set(np.unique(ids).tolist())
+        result.discard(n)
+        return result
+
+    def neighbors_of_group(self, vs: Sequence[int]) -> Set[int]:
+        vs = np.unique(np.asarray(
+            [self.make_node_id(v) for v in vs], dtype=np.int64))
+        self.compact()
+        return set(self.neighbors_of_array(vs).tolist())
+
+    def neighbors_of_neighbors(self, v: int, include_related=False) -> Set[int]:
+        v = self.make_node_id(v)
+        self.compact()
+        related = self.neighbors_of_array(np.asarray([v], dtype=np.int64))
+        group = np.union1d(related, [v])
+        related_to_related = self.neighbors_of_array(group)
+        if include_related:
+            result = np.union1d(related_to_related, related)
+        else:
+            result = related_to_related
+        return set(result.tolist()).difference({v})
+
+# region Batch Reads
+
+    def neighbors_many(self, ns) -> Tuple[np.ndarray, np.ndarray]:
+        ns = self.make_node_ids_array(ns)
+        self.compact()
+        rows = np.searchsorted(self.node_ids, ns)
+        found = rows < len(self.node_ids)
+        found[found] = self.node_ids[rows[found]] == ns[found]
+        rows = rows[found]
+        ps_from = self.gather_slices(self.indptr, rows)
+        ps_to = self.gather_slices(self.in_indptr, rows)
+        firsts = np.concatenate((
+            np.repeat(ns[found], np.diff(self.indptr)[rows]),
+            self.in_indices[ps_to],
+        ))
+        seconds = np.concatenate((
+            self.indices[ps_from],
+            np.repeat(ns[found], np.diff(self.in_indptr)[rows]),
+        ))
+        return self.group_neighbors(ns, firsts, seconds)
+
+# region Random Writes
+
+    def add(self, obj, upsert=True) -> int:
+        """
+            Buffers copies of the objects until the next read.
+            Edges with equal IDs overwrite each other, regardless of `upsert`.
+            Edges without IDs are stored under `Edge.identify_by_members`,
+            while the passed objects stay untouched.
+        """
+        if isinstance(obj, Edge):
+            _id = obj._id if obj._id >= 0 else Edge.identify_by_members(obj.first, obj.second)
+            self.pending_removals.discard(_id)
+            self.pending_edges[_id] = dataclasses.replace(obj, _id=_id)
+            return 1
+        elif isinstance(obj, Node):
+            self.registered_nodes[obj._id] = obj
+            return 1
+        elif isinstance(obj, EdgeBatch):
+            self.compact()
+            self.merge_columns([self.columns_of_edges(obj)])
+            return len(obj)
+        return super().add(obj, upsert=upsert)
+
+    def remove(self, obj) -> int:
+        if isinstance(obj, Edge):
+            if obj._id < 0:
+                self.compact()
+                ps = self.positions_between(
+                    self.make_node_id(obj.first),
+                    self.make_node_id(obj.second),
+                )
+                ps = ps[self.is_directed[ps] == obj.is_directed]
+                self.pending_removals.update(self.edge_ids[ps].tolist())
+                return len(ps)
+            self.pending_edges.pop(obj._id, None)
+            self.pending_removals.add(obj._id)
+            return 1
+        elif isinstance(obj, Node):
+            return self.remove_node(obj._id)
+        return super().remove(obj)
+
+    def remove_node(self, n) -> int:
+        n = self.make_node_id(n)
+        self.compact()
+        ps = self.positions_containing(n)
+        self.pending_removals.update(self.edge_ids[ps].tolist())
+        had_node = self.registered_nodes.pop(n, None) is not None
+        return len(ps) + int(had_node)
+
+# region Bulk Writes
+
+    def add_stream(self, stream, upsert=True) -> int:
+        """
+            Converts every chunk into columns right away and rebuilds
+            the CSR arrays only once, after the whole stream is consumed.
+        """
+        self.compact()
+        chunk_len = type(self).__max_batch_size__
+        batches = [self.columns_of_edges(es) for es in chunks(stream, chunk_len)]
+        if len(batches) == 0:
+            return 0
+        self.merge_columns(batches)
+        return sum(len(b['edge_ids']) for b in batches)
+
+    def clear_edges(self):
+        self.pending_edges = dict()
+        self.pending_removals = set()
+        self.reset_arrays()
+
+    def clear(self):
+        self.registered_nodes = dict()
+        self.clear_edges()
+
+# region Helpers
+
+    def empty_arrays(self) -> Dict[str, np.ndarray]:
+        return dict(
+            node_ids=np.zeros(0, dtype=np.int64),
+            indptr=np.zeros(1, dtype=np.int64),
+            indices=np.zeros(0, dtype=np.int64),
+            weights=np.zeros(0, dtype=np.float32),
+            labels=np.zeros(0, dtype=np.int32),
+            is_directed=np.zeros(0, dtype=np.bool_),
+            edge_ids=np.zeros(0, dtype=np.int64),
+            in_indptr=np.zeros(1, dtype=np.int64),
+            in_indices=np.zeros(0, dtype=np.int64),
+            in_positions=np.zeros(0, dtype=np.int64),
+        )
+
+    def load_arrays(self):
+        self.reset_arrays()
+
+    def reset_arrays(self):
+        self.adopt_arrays(**self.empty_arrays())
+
+    def adopt_arrays(self, **arrays):
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    def compact(self):
+        """
+            Merges buffered writes into the CSR arrays.
+            Does nothing if there are no pending changes.
+        """
+        if len(self.pending_edges) == 0 and len(self.pending_removals) == 0:
+            return
+        self.merge_columns([
+            self.columns_of_edges(list(self.pending_edges.values())),
+        ])
+
+    def merge_columns(self, batches: List[Dict[str, np.ndarray]]):
+        """
+            Rebuilds the CSR arrays from the current edges, `pending_removals`
+            and new column `batches`. Later entries overwrite earlier ones with the same ID.
+        """
+        new_ids = [b['edge_ids'] for b in batches]
+        dropped_ids = np.concatenate([np.fromiter(
+            self.pending_removals,
+            dtype=np.int64,
+            count=len(self.pending_removals),
+        )] + new_ids)
+        keep = ~np.isin(self.edge_ids, dropped_ids)
+        old = dict(
+            edge_ids=self.edge_ids[keep],
+            firsts=np.repeat(self.node_ids, np.diff(self.indptr))[keep],
+            seconds=self.indices[keep],
+            weights=self.weights[keep],
+            labels=self.labels[keep],
+            is_directed=self.is_directed[keep],
+        )
+        columns = {
+            name: np.concatenate([old[name]] + [b[name] for b in batches])
+            for name in old.keys()
+        }
+
+        # Deduplicate the new entries, keeping the last occurrence.
+        ids = columns['edge_ids']
+        _, last_reversed = np.unique(ids[::-1], return_index=True)
+        if len(last_reversed) != len(ids):
+            keep = np.sort(len(ids) - 1 - last_reversed)
+            columns = {name: c[keep] for name, c in columns.items()}
+
+        self.build_arrays(**columns)
+        self.pending_edges = dict()
+        self.pending_removals = set()
+
+    def columns_of_edges(self, es: Sequence[Edge]) -> Dict[str, np.ndarray]:
+        if isinstance(es, EdgeBatch):
+            missing = es._id < 0
+            edge_ids = es._id.copy()
+            edge_ids[missing] = [Edge.identify_by_members(first, second) for first, second in zip(
+                es.first[missing].tolist(), es.second[missing].tolist())]
+            return dict(
+                edge_ids=edge_ids,
+                firsts=es.first,
+                seconds=es.second,
+                weights=es.weight.astype(np.float32),
+                labels=es.label,
+                is_directed=es.is_directed,
+            )
+        cnt = len(es)
+        return dict(
+            edge_ids=np.fromiter(
+                (e._id if e._id >= 0 else Edge.identify_by_members(e.first, e.second)
+                 for e in es), dtype=np.int64, count=cnt),
+            firsts=np.fromiter(
+                (self.make_node_id(e.first) for e in es), dtype=np.int64, count=cnt),
+            seconds=np.fromiter(
+                (self.make_node_id(e.second) for e in es), dtype=np.int64, count=cnt),
+            weights=np.fromiter(
+                (e.weight for e in es), dtype=np.float32, count=cnt),
+            labels=np.fromiter(
+                (e.label for e in es), dtype=np.int32, count=cnt),
+            is_directed=np.fromiter(
+                (e.is_directed for e in es), dtype=np.bool_, count=cnt),
+        )
+
+    def build_arrays(self, edge_ids, firsts, seconds, weights, labels, is_directed):
+        """
+            Sorts the edge columns into forward and reverse CSR arrays.
+        """
+        order = np.lexsort((seconds, firsts))
+        firsts = firsts[order]
+        seconds = seconds[order]
+        node_ids = np.union1d(firsts, seconds)
+        cnt_nodes = len(node_ids)
+
+        indptr = np.empty(cnt_nodes + 1, dtype=np.int64)
+        indptr[:cnt_nodes] = np.searchsorted(firsts, node_ids, side='left')
+        indptr[cnt_nodes] = len(firsts)
+
+        in_positions = np.lexsort((firsts, seconds))
+        in_indptr = np.empty(cnt_nodes + 1, dtype=np.int64)
+        in_indptr[:cnt_nodes] = np.searchsorted(
+            seconds[in_positions], node_ids, side='left')
+        in_indptr[cnt_nodes] = len(seconds)
+
+        self.adopt_arrays(
+            node_ids=node_ids,
+            indptr=indptr,
+            indices=seconds,
+            weights=weights[order].astype(np.float32, copy=False),
+            labels=labels[order].astype(np.int32, copy=False),
+            is_directed=is_directed[order].astype(np.bool_, copy=False),
+            edge_ids=edge_ids[order],
+            in_indptr=in_indptr,
+            in_indices=firsts[in_positions],
+            in_positions=in_positions.astype(np.int64, copy=False),
+        )
+
+    def row_of_node(self, n: int) -> int:
+        row = int(np.searchsorted(self.node_ids, n))
+        if row < len(self.node_ids) and self.node_ids[row] == n:
+            return row
+        return -1
+
+    def rows_of_nodes(self, vs: np.ndarray) -> np.ndarray:
+        rows = np.searchsorted(self.node_ids, vs)
+        rows = rows[rows < len(self.node_ids)]
+        return rows[np.isin(self.node_ids[rows], vs)]
+
+    def gather_slices(self, indptr: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+            Concatenates the `[indptr[row], indptr[row+1])` ranges of all `rows`.
+        """
+        starts = indptr[rows]
+        return self.gather_ranges(starts, indptr[rows + 1] - starts)
+
+    def neighbors_of_array(self, vs: np.ndarray) -> np.ndarray:
+        rows = self.rows_of_nodes(vs)
+        ids = np.concatenate((
+            self.indices[self.gather_slices(self.indptr, rows)],
+            self.in_indices[self.gather_slices(self.in_indptr, rows)],
+        ))
+        return np.setdiff1d(ids, vs)
+
+    def positions_from(self, n: int) -> np.ndarray:
+        row = self.row_of_node(n)
+        if row < 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.arange(self.indptr[row], self.indptr[row+1])
+
+    def positions_to(self, n: int) -> np.ndarray:
+        row = self.row_of_node(n)
+        if row < 0:
+            return np.zeros(0, dtype=np.int64)
+        return self.in_positions[self.in_indptr[row]:self.in_indptr[row+1]]
+
+    def positions_containing(self, n: int) -> np.ndarray:
+        ps_from = self.positions_from(n)
+        ps_to = self.positions_to(n)
+        # Self-loops are present in both directions.
+        ps_to = ps_to[~np.isin(ps_to, ps_from)]
+        return np.concatenate((ps_from, ps_to))
+
+    def positions_between(self, u: int, v: int) -> np.ndarray:
+        row = self.row_of_node(u)
+        if row < 0:
+            return np.zeros(0, dtype=np.int64)
+        start = self.indptr[row]
+        end = self.indptr[row+1]
+        # Targets within a row are sorted, so we can binary search.
+        lo = start + np.searchsorted(self.indices[start:end], v, side='left')
+        hi = start + np.searchsorted(self.indices[start:end], v, side='right')
+        return np.arange(lo, hi)
+
+    def positions_of_edges(self, u, v, key=None) -> np.ndarray:
+        """
+            Mirrors the semantics of `BaseSQL.filter_edges_members`,
+            but returns positions in the forward CSR arrays.
+        """
+        self.compact()
+        u = self.make_node_id(u)
+        v = self.make_node_id(v)
+        if u < 0 and v < 0:
+            ps = np.arange(len(self.edge_ids))
+        elif u < 0 or v < 0:
+            if not self.directed:
+                ps = self.positions_containing(max(u, v))
+            elif u < 0:
+                ps = self.positions_to(v)
+            else:
+                ps = self.positions_from(u)
+        elif u == v:
+            ps = self.positions_containing(u)
+        elif self.directed:
+            ps = self.positions_between(u, v)
+        else:
+            ps = np.concatenate((
+                self.positions_between(u, v),
+                self.positions_between(v, u),
+            ))
+
+        key = self.make_label(key)
+        if key >= 0:
+            ps = ps[self.labels[ps] == key]
+        return ps
+
+    def edges_at(self, ps: np.ndarray) -> List[Edge]:
+        firsts = self.node_ids[np.searchsorted(
+            self.indptr, ps, side='right') - 1]
+        return [Edge(
+            _id=_id,
+            first=first,
+            second=second,
+            weight=weight,
+            label=label,
+            is_directed=is_directed,
+        ) for _id, first, second, weight, label, is_directed in zip(
+            self.edge_ids[ps].tolist(),
+            firsts.tolist(),
+            self.indices[ps].tolist(),
+            self.weights[ps].tolist(),
+            self.labels[ps].tolist(),
+            self.is_directed[ps].tolist(),
+        )]
+
+
+class CSR(CSRMem):
+    """
+        Persistent version of `CSRMem`. Every CSR array is dumped into a flat
+        little-endian binary file inside the `url` directory and is mapped back
+        with `numpy.memmap`. Opening a multi-GB graph only maps the files,
+        so it takes milliseconds, and multiple worker processes reading
+        the same graph share the OS page cache instead of private copies.
+
+        CAUTION:
+        Merging writes rebuilds the arrays in RAM and writes them into a new
+        `v<version>` subdirectory, reusing unchanged files through hard links.
+        The `CURRENT` manifest is then replaced atomically, so readers never mix
+        arrays of different versions. Processes that have the graph open keep
+        reading the old version until they reopen it. Only one process may write.
+
+        CAUTION:
+        Single `Edge` and `Node` writes and removals are buffered in RAM and
+        are persisted only on the next read, `flush()` or `close()`.
+        Use the graph as a context manager to make sure they aren't lost.
+
+        https://numpy.org/doc/stable/reference/generated/numpy.memmap.html
+    """
+    __is_concurrent__ = True
+    __max_batch_size__ = 5000000
+    __edge_type__ = Edge
+    __node_type__ = Node
+    __in_memory__ = False
+
+    __manifest__ = 'CURRENT'
+
+    def __init__(self, url, **kwargs):
+        self.directory = os.path.abspath(os.path.expanduser(url))
+        os.makedirs(self.directory, exist_ok=True)
+        self.version = self.load_version()
+        self.nodes_changed = False
+        CSRMem.__init__(self, url, **kwargs)
+        self.load_registered_nodes()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# region Bulk Reads
+
+    @property
+    def nodes(self) -> Generator[Node, None, None]:
+        self.compact()
+        for n in self.registered_nodes.values():
+            yield n
+        chunk_len = type(self).__max_batch_size__
+        for start in range(0, len(self.node_ids), chunk_len):
+            for _id in self.node_ids[start:start+chunk_len].tolist():
+                if _id not in self.registered_nodes:
+                    yield self.make_node(_id)
+
+    @property
+    def edges(self) -> Generator[Edge, None, None]:
+        self.compact()
+        chunk_len = type(self).__max_batch_size__
+        for start in range(0, len(self.edge_ids), chunk_len):
+            end = min(start + chunk_len, len(self.edge_ids))
+            yield from self.edges_at(np.arange(start, end))
+
+    @property
+    def out_edges(self) -> Generator[Edge, None, None]:
+        self.compact()
+        chunk_len = type(self).__max_batch_size__
+        for start in range(0, len(self.edge_ids), chunk_len):
+            mask = self.is_directed[start:start+chunk_len]
+            yield from self.edges_at(start + np.flatnonzero(mask))
+
+# region Random Writes
+
+    def add(self, obj, upsert=True) -> int:
+        if isinstance(obj, Node):
+            self.nodes_changed = True
+        return super().add(obj, upsert=upsert)
+
+    def remove_node(self, n) -> int:
+        if self.make_node_id(n) in self.registered_nodes:
+            self.nodes_changed = True
+        return super().remove_node(n)
+
+# region Bulk Writes
+
+    def clear(self):
+        super().clear()
+        self.nodes_changed = True
+        self.flush()
+
+    def flush(self):
+        """
+            Merges the pending writes and persists registered nodes.
+        """
+        self.compact()
+        if self.nodes_changed:
+            self.dump_registered_nodes()
+
+    def close(self):
+        self.flush()
+
+# region Helpers
+
+    def path_of_version(self, version: int) -> str:
+        # Version 0 is the flat layout, that predates the manifest.
+        if version == 0:
+            return self.directory
+        return os.path.join(self.directory, f'v{version}')
+
+    def path_of_array(self, name: str, version: int = None) -> str:
+        if version is None:
+            version = self.version
+        return os.path.join(self.path_of_version(version), name + '.bin')
+
+    def load_version(self) -> int:
+        path = os.path.join(self.directory, CSR.__manifest__)
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r') as file:
+            return int(file.read().strip())
+
+    def persisted_names(self) -> List[str]:
+        return list(self.empty_arrays().keys()) + [
+            'registered_ids',
+            'registered_weights',
+            'registered_labels',
+        ]
+
+    def load_arrays(self):
+        arrays = self.empty_arrays()
+        for name, empty in arrays.items():
+            path = self.path_of_array(name)
+            if not os.path.exists(path):
+                continue
+            arrays[name] = self.map_array(path, empty.dtype)
+        CSRMem.adopt_arrays(self, **arrays)
+
+    def adopt_arrays(self, **arrays):
+        """
+            Writes a complete new version of the graph and switches
+            the manifest to it, so concurrent readers either map all
+            the old arrays or all the new ones.
+        """
+        version = self.version + 1
+        directory = self.path_of_version(version)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        for name in self.persisted_names():
+            path = self.path_of_array(name, version)
+            if name in arrays:
+                array = arrays[name]
+                array.astype(array.dtype.newbyteorder('<'), copy=False).tofile(path)
+                continue
+            path_old = self.path_of_array(name)
+            if not os.path.exists(path_old):
+                continue
+            try:
+                os.link(path_old, path)
+            except OSError:
+                shutil.copyfile(path_old, path)
+
+        path_manifest = os.path.join(self.directory, CSR.__manifest__)
+        with open(path_manifest + '.tmp', 'w') as file:
+            file.write(str(version))
+        os.replace(path_manifest + '.tmp', path_manifest)
+        self.version = version
+        for name, array in arrays.items():
+            setattr(self, name, self.map_array(
+                self.path_of_array(name), array.dtype))
+
+        # Keep the previous version for readers, that are still opening it.
+        if version > 2:
+            shutil.rmtree(self.path_of_version(version - 2), ignore_errors=True)
+
+    def map_array(self, path: str, dtype) -> np.ndarray:
+        dtype = np.dtype(dtype).newbyteorder('<')
+        # Empty files can't be mapped.
+        if os.path.getsize(path) < dtype.itemsize:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def compact(self):
+        super().compact()
+        if self.nodes_changed:
+            self.dump_registered_nodes()
+
+    def dump_registered_nodes(self):
+        ns = list(self.registered_nodes.values())
+        cnt = len(ns)
+        CSR.adopt_arrays(
+            self,
+            registered_ids=np.fromiter(
+                (n._id for n in ns), dtype=np.int64, count=cnt),
+            registered_weights=np.fromiter(
+                (n.weight for n in ns), dtype=np.float32, count=cnt),
+            registered_labels=np.fromiter(
+                (n.label for n in ns), dtype=np.int32, count=cnt),
+        )
+        self.nodes_changed = False
+
+    def load_registered_nodes(self):
+        columns = dict(
+            registered_ids=np.int64,
+            registered_weights=np.float32,
+            registered_labels=np.int32,
+        )
+        for name, dtype in columns.items():
+            path = self.path_of_array(name)
+            if os.path.exists(path):
+                columns[name] = self.map_array(path, dtype)
+            else:
+                columns[name] = np.zeros(0, dtype=dtype)
+        self.registered_nodes = {_id: Node(_id=_id, weight=weight, label=label) for _id, weight, label in zip(
+            columns['registered_ids'].tolist(),
+            columns['registered_weights'].tolist(),
+            columns['registered_labels'].tolist(),
+        )}
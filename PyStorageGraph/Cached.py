@@ -0,0 +1,365 @@
+from typing import List, Optional, Dict, Generator, Set, Tuple, Sequence
+from contextlib import contextmanager
+import collections
+import collections.abc
+import threading
+
+import numpy as np
+
+from PyStorageGraph.BaseAPI import BaseAPI
+from PyStorageHelpers import *
+
+
+class CachedGraph(BaseAPI):
+    """
+        Read-through cache, that wraps any other graph backend.
+        Results of `has_edge`, `neighbors`, `successors`, `predecessors`
+        and `reduce_edges` are memorized per node and evicted in LRU order,
+        once their estimated size exceeds `capacity_bytes`.
+        Writes issued through this wrapper invalidate all the entries
+        mentioning the affected nodes. Other reads are forwarded as is.
+
+        Counters `count_hits`, `count_misses` and `count_evictions`
+        help sizing the cache for a specific workload.
+
+        CAUTION:
+        Cached results are shared between callers, so they must not be mutated.
+        Writes bypassing this wrapper (directly into the wrapped graph
+        or from other processes) are not visible until `clear_cache()`.
+    """
+    __max_batch_size__ = 100
+    __is_concurrent__ = True
+    __edge_type__ = Edge
+    __node_type__ = Node
+    __in_memory__ = False
+
+    # Rough estimates of memory consumed by a single entry and its parts.
+    __bytes_per_entry__ = 200
+    __bytes_per_edge__ = 400
+    __bytes_per_id__ = 70
+
+    def __init__(self, graph: BaseAPI, capacity_bytes: int = ram_limit, **kwargs):
+        BaseAPI.__init__(
+            self,
+            directed=graph.directed,
+            weighted=graph.weighted,
+            multigraph=graph.multigraph,
+        )
+        self.graph = graph
+        self.capacity_bytes = capacity_bytes
+        self.lock = threading.RLock()
+        self.count_generations = 0
+        self.clear_cache()
+
+# region Metadata
+
+    def reduce_nodes(self) -> GraphDegree:
+        return self.graph.reduce_nodes()
+
+    def reduce_edges(self, u=None, v=None, key=None) -> GraphDegree:
+        u = self.make_node_id(u)
+        v = self.make_node_id(v)
+        return self.cached(
+            ('reduce_edges', u, v, self.make_label(key)),
+            (u, v),
+            lambda: self.graph.reduce_edges(u, v, key),
+        )
+
+    def biggest_edge_id(self) -> int:
+        return self.graph.biggest_edge_id()
+
+    def number_of_nodes(self) -> int:
+        return self.graph.number_of_nodes()
+
+# region Bulk Reads
+
+    @property
+    def nodes(self) -> Sequence[Node]:
+        return self.graph.nodes
+
+    @property
+    def edges(self) -> Sequence[Edge]:
+        return self.graph.edges
+
+    @property
+    def out_edges(self) -> Sequence[Edge]:
+        return self.graph.out_edges
+
+    @property
+    def in_edges(self) -> Sequence[Edge]:
+        return self.graph.in_edges
+
+    @property
+    def mentioned_nodes_ids(self) -> Sequence[int]:
+        return self.graph.mentioned_nodes_ids
+
+# region Random Reads
+
+    def has_node(self, n) -> Optional[Node]:
+        return self.graph.has_node(n)
+
+    def has_edge(self, u, v, key=None) -> Sequence[Edge]:
+        u = self.make_node_id(u)
+        v = self.make_node_id(v)
+        return self.cached(
+            ('has_edge', u, v, self.make_label(key)),
+            (u, v),
+            lambda: self.graph.has_edge(u, v, key),
+        )
+
+    def neighbors(self, n) -> Sequence[int]:
+        n = self.make_node_id(n)
+        return self.cached(
+            ('neighbors', n),
+            (n, ),
+            lambda: self.graph.neighbors(n),
+        )
+
+    def successors(self, n) -> Sequence[int]:
+        n = self.make_node_id(n)
+        return self.cached(
+            ('successors', n),
+            (n, ),
+            lambda: self.graph.successors(n),
+        )
+
+    def predecessors(self, n) -> Sequence[int]:
+        n = self.make_node_id(n)
+        return self.cached(
+            ('predecessors', n),
+            (n, ),
+            lambda: self.graph.predecessors(n),
+        )
+
+    def neighbors_of_group(self, vs: Sequence[int]) -> Set[int]:
+        return self.graph.neighbors_of_group(vs)
+
+    def neighbors_of_neighbors(self, v: int, include_related=False) -> Set[int]:
+        return self.graph.neighbors_of_neighbors(v, include_related=include_related)
+
+    def bfs(self, v: int, max_depth: int) -> Dict[int, int]:
+        return self.graph.bfs(v, max_depth)
+
+    def k_hop_neighbors(self, v: int, k: int) -> Set[int]:
+        return self.graph.k_hop_neighbors(v, k)
+
+# region Batch Reads
+
+    def reduce_edges_many(self, us, vs, key=None):
+        return self.graph.reduce_edges_many(us, vs, key)
+
+    def neighbors_many(self, ns):
+        return self.graph.neighbors_many(ns)
+
+    def has_nodes(self, ns):
+        return self.graph.has_nodes(ns)
+
+# region Random Writes
+
+    def add(self, obj, upsert=True) -> int:
+        # Registering nodes doesn't affect any of the cached queries.
+        if is_sequence_of(obj, Edge) or isinstance(obj, (Edge, EdgeBatch)):
+            return self.written(obj, lambda: self.graph.add(obj, upsert=upsert))
+        return self.graph.add(obj, upsert=upsert)
+
+    def remove(self, obj) -> int:
+        return self.written(obj, lambda: self.graph.remove(obj))
+
+    def remove_node(self, n) -> int:
+        return self.written(self.make_node(n), lambda: self.graph.remove_node(n))
+
+    def add_missing_nodes(self) -> int:
+        return self.graph.add_missing_nodes()
+
+# region Bulk Writes
+
+    def add_stream(self, stream, upsert=True) -> int:
+        try:
+            return self.graph.add_stream(stream, upsert=upsert)
+        finally:
+            self.clear_cache()
+
+    def clear_edges(self):
+        try:
+            return self.graph.clear_edges()
+        finally:
+            self.clear_cache()
+
+    def clear(self):
+        try:
+            return self.graph.clear()
+        finally:
+            self.clear_cache()
+
+# region Transactions
+
+    @contextmanager
+    def transaction(self):
+        with self.graph.transaction():
+            try:
+                yield self
+            except Exception as e:
+                # Results read within a rolled back transaction may be outdated.
+                self.clear_cache()
+                raise e
+
+# region Indexes
+
+    def list_indexes(self) -> Dict[str, Tuple[str, ...]]:
+        return self.graph.list_indexes()
+
+    def create_index(self, name: str, fields: Sequence[str]) -> bool:
+        return self.graph.create_index(name, fields)
+
+    def drop_index(self, name: str) -> bool:
+        return self.graph.drop_index(name)
+
+# region Cache
+
+    @property
+    def hit_rate(self) -> float:
+        cnt_requests = self.count_hits + self.count_misses
+        if cnt_requests == 0:
+            return 0
+        return self.count_hits / cnt_requests
+
+    def clear_cache(self):
+        with self.lock:
+            self.clear_cache_entries()
+            self.count_hits = 0
+            self.count_misses = 0
+            self.count_evictions = 0
+
+    def cached(self, request: tuple, members: Tuple[int, ...], compute):
+        with self.lock:
+            if request in self.entries:
+                self.entries.move_to_end(request)
+                self.count_hits += 1
+                return self.entries[request][0]
+            self.count_misses += 1
+            generation = self.count_generations
+
+        result = compute()
+        size = self.estimate_size(result)
+        if size > self.capacity_bytes:
+            return result
+
+        members = tuple({m for m in members if m >= 0}) or (-1, )
+        with self.lock:
+            # Don't memorize results, that may have been outdated
+            # by concurrent writes.
+            if generation != self.count_generations:
+                return result
+            if request in self.entries:
+                return result
+            self.entries[request] = (result, size)
+            self.nodes_by_entry[request] = members
+            for m in members:
+                self.entries_by_node.setdefault(m, set()).add(request)
+            self.count_bytes += size
+            while self.count_bytes > self.capacity_bytes:
+                evicted, (_, evicted_size) = self.entries.popitem(last=False)
+                self.count_bytes -= evicted_size
+                self.unlink(evicted)
+                self.count_evictions += 1
+        return result
+
+    def written(self, obj, write):
+        """
+            Drops cached results affected by `obj` both before and after the `write`.
+            Results computed concurrently with the write are either discarded
+            by the generation check in `cached` or evicted by the second pass,
+            so no stale entry survives it.
+        """
+        ns = self.affected_nodes(obj)
+        self.invalidate_nodes(ns)
+        try:
+            return write()
+        finally:
+            self.invalidate_nodes(ns)
+
+    def invalidate(self, obj):
+        """
+            Drops cached results that may be affected by adding or removing `obj`.
+        """
+        self.invalidate_nodes(self.affected_nodes(obj))
+
+    def affected_nodes(self, obj) -> Optional[List[int]]:
+        """
+            Lists nodes, whose cached results may change after adding
+            or removing `obj`, or returns `None` if any result can change.
+        """
+        if isinstance(obj, Edge):
+            if obj.first < 0 and obj.second < 0:
+                return None
+            return [obj.first, obj.second]
+        elif isinstance(obj, Node):
+            # Removing a node also removes its edges,
+            # which changes the neighborhoods of related nodes.
+            with self.lock:
+                related = self.entries.get(('neighbors', obj._id), None)
+            if related is None:
+                related = self.graph.neighbors(obj._id)
+            else:
+                related = related[0]
+            return [obj._id, *related]
+        elif isinstance(obj, EdgeBatch):
+            ns = np.unique(np.concatenate([obj.first, obj.second]))
+            if len(ns) and ns[0] < 0:
+                return None
+            return ns.tolist()
+        elif isinstance(obj, collections.abc.Sequence):
+            ns = []
+            for o in obj:
+                affected = self.affected_nodes(o)
+                if affected is None:
+                    return None
+                ns.extend(affected)
+            return ns
+        return []
+
+    def invalidate_nodes(self, ns: Optional[Sequence[int]]):
+        if ns is None:
+            self.clear_cache_entries()
+            return
+        with self.lock:
+            self.count_generations += 1
+            requests = set(self.entries_by_node.get(-1, set()))
+            for n in ns:
+                requests.update(self.entries_by_node.get(n, set()))
+            for request in requests:
+                self.forget(request)
+
+    def forget(self, request: tuple):
+        entry = self.entries.pop(request, None)
+        if entry is not None:
+            self.count_bytes -= entry[1]
+        self.unlink(request)
+
+    def unlink(self, request: tuple):
+        for m in self.nodes_by_entry.pop(request, ()):
+            requests = self.entries_by_node.get(m, None)
+            if requests is None:
+                continue
+            requests.discard(request)
+            if len(requests) == 0:
+                self.entries_by_node.pop(m)
+
+    def clear_cache_entries(self):
+        with self.lock:
+            self.count_generations += 1
+            # Maps the request to `(result, size)` in the order of usage.
+            self.entries = collections.OrderedDict()
+            # Maps node IDs to requests mentioning them.
+            # Requests without any specific node are stored under `-1`.
+            self.entries_by_node: Dict[int, Set[tuple]] = dict()
+            self.nodes_by_entry: Dict[tuple, Tuple[int, ...]] = dict()
+            self.count_bytes = 0
+
+    def estimate_size(self, result) -> int:
+        cls = type(self)
+        if isinstance(result, (list, tuple)):
+            return cls.__bytes_per_entry__ + cls.__bytes_per_edge__ * len(result)
+        elif isinstance(result, (set, frozenset)):
+            return cls.__bytes_per_entry__ + cls.__bytes_per_id__ * len(result)
+        return cls.__bytes_per_entry__
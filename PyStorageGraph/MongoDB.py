@@ -1,13 +1,18 @@
 from typing import List, Optional, Dict, Generator, Set, Tuple, Sequence
+from contextlib import contextmanager
+import collections
+import threading
 
 # Properties of every entry are: 'from_id', 'to_id', 'weight'
 # There are indexes by find keys.
 import pymongo
 from pymongo import MongoClient
 from pymongo import UpdateOne
+import numpy as np
 
 from PyStorageGraph.BaseAPI import BaseAPI
 from PyStorageHelpers import *
+from PyStorageHelpers.MongoWrites import write_mongo_dicts
 
 
 class MongoDB(BaseAPI):
@@ -23,21 +28,62 @@ class MongoDB(BaseAPI):
     __is_concurrent__ = True
     __edge_type__ = Edge
     __node_type__ = Node
+    __accepts_edge_batches__ = True
+    # Multikey index over both members of every edge, used by `$graphLookup`.
+    __edge_indexes__ = dict(
+        BaseAPI.__edge_indexes__,
+        index_members=('members', ),
+    )
+    __edges_collection__ = 'edges'
+    # Nodes with more edges are traversed by `bfs_by_levels`,
+    # as `$graphLookup` would collect too many documents for them.
+    __max_graph_lookup_degree__ = 10000
 
     def __init__(self, url='mongodb://localhost:27017/graph', **kwargs):
         BaseAPI.__init__(self, **kwargs)
         _, db_name = extract_database_name(url)
         self.db = MongoClient(url)
-        self.edges_collection = self.db[db_name]['edges']
+        self.edges_collection = self.db[db_name][type(self).__edges_collection__]
         self.nodes_collection = self.db[db_name]['nodes']
-        self.create_index()
+        # Session pinned by `transaction()` for the current thread.
+        self.pinned = threading.local()
+        # Errors collected by the last `add_stream`.
+        self.write_errors = list()
+        self.create_indexes()
+
+    @property
+    def session(self):
+        return getattr(self.pinned, 'session', None)
+
+    @contextmanager
+    def transaction(self):
+        """
+            Starts a client session with a multi-document transaction,
+            that is passed to every operation within the block.
+
+            CAUTION:
+            Transactions are only supported by replica sets and sharded clusters.
+            Collections can't be created or dropped inside them before MongoDB 4.4.
+            https://docs.mongodb.com/manual/core/transactions/
+        """
+        if self.session is not None:
+            yield self
+            return
+
+        with self.db.start_session() as session:
+            with session.start_transaction():
+                self.pinned.session = session
+                try:
+                    yield self
+                finally:
+                    self.pinned.session = None
 
 # region Metadata
 
     def reduce_nodes(self) -> GraphDegree:
         result = self.nodes_collection.aggregate(pipeline=[
             self.pipe_compute_degree()
-        ])
+        ], session=self.session)
         result = list(result)
         if len(result) == 0:
             return GraphDegree(0, 0)
@@ -48,7 +94,7 @@ class MongoDB(BaseAPI):
             self.pipe_match_edge_members(u, v),
             self.pipe_match_label(key),
             self.pipe_compute_degree()
-        ] if step])
+        ] if step], session=self.session)
         result = list(result)
         if len(result) == 0:
             return GraphDegree(0, 0)
@@ -58,6 +104,7 @@ class MongoDB(BaseAPI):
         result = self.edges_collection.find(
             {},
             sort=[('_id', pymongo.DESCENDING)],
+            session=self.session,
         ).limit(1)
         result = list(result)
         if len(result) == 0:
@@ -67,28 +114,38 @@ class MongoDB(BaseAPI):
 # region Bulk Reads
 
     @property
-    def nodes(self) -> Sequence[Node]:
-        return [Node(**as_dict) for as_dict in self.nodes_collection.find()]
+    def nodes(self) -> Generator[Node, None, None]:
+        result = self.nodes_collection.find(
+            batch_size=type(self).__fetch_batch_size__,
+            session=self.session,
+        )
+        return (Node(**as_dict) for as_dict in result)
 
     @property
-    def edges(self) -> Sequence[Edge]:
-        return [Edge(**as_dict) for as_dict in self.edges_collection.find()]
+    def edges(self) -> Generator[Edge, None, None]:
+        result = self.edges_collection.find(
+            projection=self.projection_of_edges(),
+            batch_size=type(self).__fetch_batch_size__,
+            session=self.session,
+        )
+        return self.edges_from_docs(result)
 
     @property
-    def out_edges(self) -> Sequence[Edge]:
+    def out_edges(self) -> Generator[Edge, None, None]:
         result = self.edges_collection.find(filter={
             'is_directed': True,
-        })
-        return [Edge(**as_dict) for as_dict in result]
+        }, projection=self.projection_of_edges(),
+            batch_size=type(self).__fetch_batch_size__, session=self.session)
+        return self.edges_from_docs(result)
 
     @property
     def mentioned_nodes_ids(self) -> Sequence[int]:
         ids = set()
         # Calling `.distinct('first')` on the query object fails,
         # as the result BSON will be beyond 16 MB.
-        for doc in self.edges_collection.find({}, {'_id': 0, 'first': 1}):
+        for doc in self.edges_collection.find({}, {'_id': 0, 'first': 1}, session=self.session):
             ids.add(doc['first'])
-        for doc in self.edges_collection.find({}, {'_id': 0, 'second': 1}):
+        for doc in self.edges_collection.find({}, {'_id': 0, 'second': 1}, session=self.session):
             ids.add(doc['second'])
         return ids
 
@@ -98,7 +155,7 @@ class MongoDB(BaseAPI):
         n = self.make_node_id(n)
         result = self.nodes_collection.find_one(filter={
             '_id': n,
-        })
+        }, session=self.session)
         if result:
             return Node(**result)
         return None
@@ -107,8 +164,45 @@ class MongoDB(BaseAPI):
         result = self.edges_collection.aggregate(pipeline=[step for step in [
             self.pipe_match_edge_members(u, v),
             self.pipe_match_label(key),
-        ] if step])
-        return [Edge(**as_dict) for as_dict in result]
+            {'$project': self.projection_of_edges()},
+        ] if step], session=self.session)
+        return list(self.edges_from_docs(result))
+
+    def neighbors(self, n) -> Set[int]:
+        """
+            Projects every related edge onto the ID of the opposite member
+            and groups them on the server, so only unique IDs are transferred.
+        """
+        n = self.make_node_id(n)
+        result = self.edges_collection.aggregate(pipeline=[
+            {'$match': {'$or': [{'first': n}, {'second': n}]}},
+            {'$project': {
+                '_id': 0,
+                'other': {'$cond': [{'$eq': ['$first', n]}, '$second', '$first']},
+            }},
+            {'$group': {'_id': '$other'}},
+        ], allowDiskUse=True, session=self.session)
+        result = {doc['_id'] for doc in result}
+        result.discard(n)
+        return result
+
+    def successors(self, n) -> Set[int]:
+        if not self.directed:
+            return self.neighbors(n)
+        n = self.make_node_id(n)
+        result = set(self.edges_collection.distinct(
+            'second', {'first': n}, session=self.session))
+        result.discard(n)
+        return result
+
+    def predecessors(self, n) -> Set[int]:
+        if not self.directed:
+            return self.neighbors(n)
+        n = self.make_node_id(n)
+        result = set(self.edges_collection.distinct(
+            'first', {'second': n}, session=self.session))
+        result.discard(n)
+        return result
 
     def neighbors_of_group(self, vs: Sequence[int]) -> Set[int]:
         vs_set = set(vs)
@@ -120,16 +214,233 @@ class MongoDB(BaseAPI):
                 'second': {'$in': vs},
             }],
         }, projection={
+            '_id': 0,
             'first': 1,
             'second': 1,
-        })
-        es = [Edge(**as_dict) for as_dict in result]
-        vs_unique = self.unique_members_of_edges(es)
+        }, session=self.session)
+        vs_unique = set()
+        for doc in result:
+            vs_unique.add(doc.get('first', -1))
+            vs_unique.add(doc.get('second', -1))
+        vs_unique.discard(-1)
         return vs_unique.difference(vs_set)
 
+# region Traversals
+
+    def neighbors_of_neighbors(self, v: int, include_related=False) -> Set[int]:
+        depths = self.bfs(v, 2)
+        min_depth = 1 if include_related else 2
+        return {n for n, depth in depths.items() if depth >= min_depth}
+
+    def k_hop_neighbors(self, v: int, k: int) -> Set[int]:
+        result = set(self.bfs(v, k).keys())
+        result.discard(self.make_node_id(v))
+        return result
+
+    def bfs(self, v: int, max_depth: int) -> Dict[int, int]:
+        """
+            Follows the `members` arrays of edges with `$graphLookup`,
+            so the expansion is done in a single aggregation and only
+            distinct node IDs with their depths are returned.
+            An edge found at depth `d` links nodes at most `d + 1` hops away.
+            The following `$unwind` is coalesced into `$graphLookup`,
+            so the `reached` array isn't materialized as a single document.
+
+            CAUTION:
+            `$graphLookup` ignores `allowDiskUse` and must fit into 100 MB of RAM.
+            So we fall back to `bfs_by_levels` for nodes with more than
+            `__max_graph_lookup_degree__` edges, on any `OperationFailure`
+            and if some edges lack `members`, as those would never be matched.
+            Call `add_missing_members` once to backfill them.
+            https://docs.mongodb.com/manual/reference/operator/aggregation/graphLookup/#memory
+        """
+        v = self.make_node_id(v)
+        if max_depth <= 0:
+            return {v: 0}
+        if self.has_edges_without_members():
+            return self.bfs_by_levels(v, max_depth)
+        max_degree = type(self).__max_graph_lookup_degree__
+        degree = self.edges_collection.count_documents(
+            filter={'members': v}, limit=max_degree + 1, session=self.session)
+        if degree == 0:
+            return {v: 0}
+        if degree > max_degree:
+            return self.bfs_by_levels(v, max_depth)
+        pipeline = [
+            {'$match': {'members': v}},
+            {'$limit': 1},
+            {'$graphLookup': {
+                'from': self.edges_collection.name,
+                'startWith': v,
+                'connectFromField': 'members',
+                'connectToField': 'members',
+                'as': 'reached',
+                'maxDepth': max_depth - 1,
+                'depthField': 'depth',
+            }},
+            {'$unwind': '$reached'},
+            {'$unwind': '$reached.members'},
+            {'$group': {
+                '_id': '$reached.members',
+                'depth': {'$min': '$reached.depth'},
+            }},
+        ]
+        try:
+            result = self.edges_collection.aggregate(
+                pipeline=pipeline, allowDiskUse=True, session=self.session)
+            depths = {doc['_id']: doc['depth'] + 1 for doc in result}
+        except pymongo.errors.OperationFailure:
+            return self.bfs_by_levels(v, max_depth)
+        depths[v] = 0
+        return depths
+
+    def has_edges_without_members(self) -> bool:
+        # Missing fields are indexed as `null`, so this is a single index lookup.
+        return self.edges_collection.find_one(
+            filter={'members': None},
+            projection={'_id': 1},
+            session=self.session,
+        ) is not None
+
+    def add_missing_members(self) -> int:
+        """
+            Backfills `members` of edges written by older versions
+            or imported by external tools. Requires MongoDB 4.2.
+        """
+        return self.edges_collection.update_many(
+            filter={'members': None},
+            update=[{'$set': {'members': ['$first', '$second']}}],
+            session=self.session,
+        ).modified_count
+
+    def bfs_by_levels(self, v: int, max_depth: int) -> Dict[int, int]:
+        """
+            Expands one level per aggregation, grouping IDs on the server.
+            Slower than `$graphLookup`, but spills to disk and works
+            with edges imported without the `members` field.
+        """
+        v = self.make_node_id(v)
+        depths = {v: 0}
+        frontier = [v]
+        for depth in range(1, max_depth + 1):
+            result = self.edges_collection.aggregate(pipeline=[
+                {'$match': {'$or': [
+                    {'first': {'$in': frontier}},
+                    {'second': {'$in': frontier}},
+                ]}},
+                {'$project': {'_id': 0, 'members': ['$first', '$second']}},
+                {'$unwind': '$members'},
+                {'$group': {'_id': '$members'}},
+            ], allowDiskUse=True, session=self.session)
+            frontier = [doc['_id']
+                        for doc in result if doc['_id'] not in depths]
+            if len(frontier) == 0:
+                break
+            for n in frontier:
+                depths[n] = depth
+        return depths
+
+# region Batch Reads
+
+    def reduce_edges_many(self, us, vs, key=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Answers the whole batch with a single `$facet` aggregation.
+            The preceding `$match` lets MongoDB use the `first` and `second` indexes.
+        """
+        us, vs = self.make_node_ids_pairs(us, vs)
+        split = self.split_pairs(us, vs)
+
+        def make_group(_id) -> dict:
+            return {
+                '$group': {
+                    '_id': _id,
+                    'count': {'$sum': 1},
+                    'weight': {'$sum': '$weight'},
+                }
+            }
+
+        filters = []
+        facets = dict()
+        if len(split['pair_us']):
+            f = {
+                'first': {'$in': np.unique(split['pair_us']).tolist()},
+                'second': {'$in': np.unique(split['pair_vs']).tolist()},
+            }
+            filters.append(f)
+            facets['pairs'] = [
+                {'$match': f},
+                make_group({'a': '$first', 'b': '$second'}),
+            ]
+        if len(split['outs']):
+            f = {'first': {'$in': split['outs'].tolist()}}
+            filters.append(f)
+            facets['outs'] = [{'$match': f}, make_group('$first')]
+        if len(split['ins']):
+            f = {'second': {'$in': split['ins'].tolist()}}
+            filters.append(f)
+            facets['ins'] = [{'$match': f}, make_group('$second')]
+        if len(split['loops']):
+            facets['loops'] = [
+                {'$match': {
+                    'first': {'$in': split['loops'].tolist()},
+                    '$expr': {'$eq': ['$first', '$second']},
+                }},
+                make_group('$first'),
+            ]
+        if split['total']:
+            facets['total'] = [make_group(None)]
+
+        groups = {name: dict() for name in ['pairs', 'outs', 'ins', 'loops', 'total']}
+        if len(facets):
+            pipeline = [step for step in [
+                self.pipe_match_label(key),
+                None if split['total'] else {'$match': {'$or': filters}},
+                {'$facet': facets},
+            ] if step]
+            for doc in self.edges_collection.aggregate(pipeline=pipeline, allowDiskUse=True, session=self.session):
+                for name, results in doc.items():
+                    for r in results:
+                        member = r['_id']
+                        if name == 'pairs':
+                            member = (member['a'], member['b'])
+                        groups[name][member] = (r['count'], r['weight'])
+        return self.assemble_reduced(
+            us, vs,
+            pairs=groups['pairs'],
+            outs=groups['outs'],
+            ins=groups['ins'],
+            loops=groups['loops'],
+            total=groups['total'].get(None, (0, 0)),
+        )
+
+    def neighbors_many(self, ns) -> Tuple[np.ndarray, np.ndarray]:
+        ns = self.make_node_ids_array(ns)
+        vs = np.unique(ns).tolist()
+        result = self.edges_collection.find(filter={
+            '$or': [{
+                'first': {'$in': vs},
+            }, {
+                'second': {'$in': vs},
+            }],
+        }, projection={
+            '_id': 0,
+            'first': 1,
+            'second': 1,
+        }, session=self.session)
+        members = [(doc.get('first', -1), doc.get('second', -1)) for doc in result]
+        members = np.asarray(members, dtype=np.int64).reshape((-1, 2))
+        return self.group_neighbors(ns, members[:, 0], members[:, 1])
+
 # region Random Writes
 
     def add(self, obj, upsert=True) -> int:
+        if isinstance(obj, EdgeBatch):
+            return self.add_dicts(
+                self.edges_collection,
+                [self.doc_of_edge(d) for d in obj.to_dicts()],
+                upsert=upsert,
+            )
+
         is_edge = isinstance(obj, Edge)
         is_node = isinstance(obj, Node)
         is_edges = is_sequence_of(obj, Edge)
@@ -139,42 +450,32 @@ class MongoDB(BaseAPI):
 
         # A single `Edge` or `Node`
         if is_edge or is_node:
+            doc = self.doc_of_edge(obj.__dict__) if is_edge else obj.__dict__
             if upsert:
                 return target.update_one(
                     filter={'_id': obj._id, },
-                    update={'$set': obj.__dict__, },
+                    update={'$set': doc, },
                     upsert=True,
+                    session=self.session,
                 ).modified_count >= 1
             else:
-                return target.insert_one(obj.__dict__).acknowledged
+                return target.insert_one(doc, session=self.session).acknowledged
 
         # Many objects.
-        elif is_edges or is_nodes:
-            if upsert:
-                def make_upsert(o):
-                    return UpdateOne(
-                        filter={'_id': o._id, },
-                        update={'$set': o.__dict__, },
-                        upsert=True,
-                    )
-                ops = list(map(make_upsert, obj))
-                try:
-                    result = target.bulk_write(
-                        requests=ops, ordered=False)
-                    cnt_old = result.bulk_api_result['nUpserted']
-                    cnt_new = result.bulk_api_result['nInserted']
-                    return cnt_new + cnt_old
-                except pymongo.errors.BulkWriteError as bwe:
-                    print(bwe)
-                    print(bwe.details['writeErrors'])
-                    return 0
-            else:
-                obj = [o.__dict__ for o in obj]
-                result = target.insert_many(obj, ordered=False)
-                return len(result.inserted_ids)
+        elif is_edges:
+            return self.add_dicts(target, [self.doc_of_edge(o.__dict__) for o in obj], upsert=upsert)
+        elif is_nodes:
+            return self.add_dicts(target, [o.__dict__ for o in obj], upsert=upsert)
 
         return super().add(obj, upsert=upsert)
 
+    def add_dicts(self, target, docs: Sequence[dict], upsert=True) -> int:
+        cnt_written, write_errors = write_mongo_dicts(
+            target, docs, upsert=upsert, session=self.session)
+        if len(write_errors):
+            print(write_errors)
+        return cnt_written
+
     def remove(self, obj) -> int:
         is_edge = isinstance(obj, Edge)
         is_node = isinstance(obj, Node)
@@ -188,43 +489,112 @@ class MongoDB(BaseAPI):
 
         # A single `Edge` or `Node`
         if is_edge or is_node:
-            return target.delete_one(filter={'_id': obj._id, }).deleted_count >= 1
+            return target.delete_one(filter={'_id': obj._id, }, session=self.session).deleted_count >= 1
 
         # Many objects.
         else:
             ids = list([o._id for o in obj])
             return target.delete_many(filter={'_id': {
                 '$in': ids
-            }, }).deleted_count
+            }, }, session=self.session).deleted_count
 
     def remove_node(self, n) -> int:
-        self.remove(self.make_node(n))
+        v = self.make_node_id(n)
+        self.remove(self.make_node(v))
         result = self.edges_collection.delete_many(filter={
             '$or': [
                 {'first': v},
                 {'second': v},
             ]
-        })
+        }, session=self.session)
         return result.deleted_count
 
 # region Bulk Writes
 
+    def add_stream(self, stream, upsert=True, max_workers: Optional[int] = None) -> int:
+        """
+            Partitions the stream into batches of `__max_batch_size__` edges
+            and submits them concurrently over the connection pool of `MongoClient`,
+            which is thread-safe. Write errors of all batches are collected
+            into `write_errors` instead of interrupting the import.
+
+            CAUTION:
+            Sessions can't be shared between threads, so within
+            a `transaction()` the batches are written sequentially.
+        """
+        if self.session is not None:
+            max_workers = 1
+        self.write_errors = list()
+        count_edges_added = 0
+        for cnt_written, write_errors in map_concurrently(
+            lambda es: self.write_edges(es, upsert=upsert),
+            chunks(stream, type(self).__max_batch_size__),
+            max_workers=max_workers,
+        ):
+            count_edges_added += cnt_written
+            self.write_errors.extend(write_errors)
+        if len(self.write_errors):
+            print(f'Failed to write {len(self.write_errors)} edges, see `write_errors`')
+        self.add_missing_nodes()
+        return count_edges_added
+
+    def write_edges(self, es, upsert=True) -> Tuple[int, list]:
+        if isinstance(es, EdgeBatch):
+            docs = [self.doc_of_edge(d) for d in es.to_dicts()]
+        else:
+            docs = [self.doc_of_edge(e.__dict__) for e in es]
+        return write_mongo_dicts(
+            self.edges_collection, docs, upsert=upsert, session=self.session)
+
     def clear_edges(self):
         self.edges_collection.drop()
+        self.create_indexes()
 
     def clear(self):
         self.edges_collection.drop()
         self.nodes_collection.drop()
+        self.create_indexes()
 
-# region Helpers
+# region Indexes
 
-    def create_index(self, background=False):
-        self.edges_collection.create_index(
-            'first', background=background, sparse=True)
-        self.edges_collection.create_index(
-            'second', background=background, sparse=True)
+    def list_indexes(self) -> Dict[str, Tuple[str, ...]]:
+        return {
+            name: tuple(field for field, _ in info['key'])
+            for name, info in self.edges_collection.index_information().items()
+            if name != '_id_'
+        }
+
+    def create_index(self, name: str, fields: Sequence[str], background=False) -> bool:
         self.edges_collection.create_index(
-            'is_directed', background=background, sparse=True)
+            [(f, pymongo.ASCENDING) for f in fields],
+            name=name,
+            background=background,
+        )
+        return True
+
+    def drop_index(self, name: str) -> bool:
+        if name not in self.list_indexes():
+            return False
+        self.edges_collection.drop_index(name)
+        return True
+
+# region Helpers
+
+    def doc_of_edge(self, as_dict: dict) -> dict:
+        # Traversals need both members in a single array field.
+        doc = dict(as_dict)
+        doc['members'] = [doc['first'], doc['second']]
+        return doc
+
+    def edge_from_doc(self, doc: dict) -> Edge:
+        doc.pop('members', None)
+        return Edge(**doc)
+
+    def edges_from_docs(self, docs) -> Generator[Edge, None, None]:
+        return (self.edge_from_doc(doc) for doc in docs)
+
+    def projection_of_edges(self) -> dict:
+        return {'members': 0}
 
     def pipe_compute_degree(self) -> dict:
         return {
@@ -281,3 +651,451 @@ class MongoDB(BaseAPI):
         if key < 0:
             return None
         return {'$match': {'label': key}}
+
+
+class MongoDBAdjacency(MongoDB):
+    """
+        Alternative layout with one document per node instead of one per edge.
+        Every document keeps `out` and `in` arrays sorted by the ID `v`
+        of the opposite member, along with the edge `weight` (`w`),
+        ID (`e`), label (`l`) and direction (`d`), so that `Edge` objects
+        can be reassembled and `has_edge`/`reduce_edges` behave like in `MongoDB`.
+        This way `neighbors`, `successors` and `predecessors` are answered
+        with a point lookup by `_id`, instead of scanning the `first` and `second`
+        indexes and fetching every matching edge document.
+
+        Nodes with more than `__max_bucket_size__` entries spill into
+        overflow documents with IDs like `"<node>:<bucket>"`, keeping
+        every document far from the 16 MB BSON limit. The primary document
+        stores the number of such `buckets`. Arrays are only sorted within
+        a single document.
+        https://www.mongodb.com/blog/post/building-with-patterns-the-bucket-pattern
+
+        CAUTION:
+        Every edge is stored twice: in the `out` array of its `first` member
+        and the `in` array of its `second` member. Removals rely on pipeline
+        updates, which require MongoDB 4.2 or newer.
+        Buckets are assigned on the client. Threads of one instance take turns
+        doing that, but every other process or client adding edges to the same
+        node at the same time can overfill its last bucket by up to
+        `__max_batch_size__` entries.
+    """
+    __max_bucket_size__ = 10000
+    __edges_collection__ = 'adjacency'
+    # Primary and overflow documents of a node share the `node` field,
+    # while `out.e` is needed to locate edges by their IDs.
+    __edge_indexes__ = {
+        'index_node': ('node', ),
+        'index_edge_ids': ('out.e', ),
+    }
+
+    def __init__(self, url='mongodb://localhost:27017/graph', **kwargs):
+        MongoDB.__init__(self, url, **kwargs)
+        # Serializes bucket assignment between the threads of `add_stream`.
+        self.buckets_lock = threading.Lock()
+
+# region Metadata
+
+    def reduce_edges(self, u=None, v=None, key=None) -> GraphDegree:
+        result = self.edges_collection.aggregate(pipeline=[
+            *self.pipe_unwind_edges(self.nodes_to_unwind(u, v)),
+            *[step for step in [
+                self.pipe_match_edge_members(u, v),
+                self.pipe_match_label(key),
+                self.pipe_compute_degree(),
+            ] if step],
+        ], allowDiskUse=True, session=self.session)
+        result = list(result)
+        if len(result) == 0:
+            return GraphDegree(0, 0)
+        return GraphDegree(result[0]['count'], result[0]['weight'])
+
+    def biggest_edge_id(self) -> int:
+        result = self.edges_collection.aggregate(pipeline=[
+            {'$group': {'_id': None, 'biggest': {'$max': {'$max': '$out.e'}}}},
+        ], session=self.session)
+        result = list(result)
+        if len(result) == 0 or result[0]['biggest'] is None:
+            return 0
+        return int(result[0]['biggest'])
+
+# region Bulk Reads
+
+    @property
+    def edges(self) -> Generator[Edge, None, None]:
+        result = self.edges_collection.aggregate(
+            pipeline=self.pipe_unwind_edges(),
+            allowDiskUse=True,
+            batchSize=type(self).__fetch_batch_size__,
+            session=self.session,
+        )
+        return (self.edge_from_doc(as_dict) for as_dict in result)
+
+    @property
+    def out_edges(self) -> Generator[Edge, None, None]:
+        result = self.edges_collection.aggregate(
+            pipeline=[*self.pipe_unwind_edges(), {'$match': {'is_directed': True}}],
+            allowDiskUse=True,
+            batchSize=type(self).__fetch_batch_size__,
+            session=self.session,
+        )
+        return (self.edge_from_doc(as_dict) for as_dict in result)
+
+    @property
+    def mentioned_nodes_ids(self) -> Sequence[int]:
+        result = self.edges_collection.find(
+            {'cnt': {'$gt': 0}},
+            {'_id': 0, 'node': 1},
+            session=self.session,
+        )
+        return {doc['node'] for doc in result}
+
+# region Random Reads
+
+    def has_edge(self, u, v, key=None) -> Sequence[Edge]:
+        result = self.edges_collection.aggregate(pipeline=[
+            *self.pipe_unwind_edges(self.nodes_to_unwind(u, v)),
+            *[step for step in [
+                self.pipe_match_edge_members(u, v),
+                self.pipe_match_label(key),
+            ] if step],
+        ], allowDiskUse=True, session=self.session)
+        return [self.edge_from_doc(as_dict) for as_dict in result]
+
+    def neighbors(self, n) -> Set[int]:
+        n = self.make_node_id(n)
+        result = set()
+        for doc in self.adjacency_docs(n, ['out', 'in']):
+            result.update(entry['v'] for entry in doc.get('out', []))
+            result.update(entry['v'] for entry in doc.get('in', []))
+        result.discard(n)
+        return result
+
+    def successors(self, n) -> Set[int]:
+        if not self.directed:
+            return self.neighbors(n)
+        n = self.make_node_id(n)
+        result = set()
+        for doc in self.adjacency_docs(n, ['out']):
+            result.update(entry['v'] for entry in doc.get('out', []))
+        result.discard(n)
+        return result
+
+    def predecessors(self, n) -> Set[int]:
+        if not self.directed:
+            return self.neighbors(n)
+        n = self.make_node_id(n)
+        result = set()
+        for doc in self.adjacency_docs(n, ['in']):
+            result.update(entry['v'] for entry in doc.get('in', []))
+        result.discard(n)
+        return result
+
+    def neighbors_of_group(self, vs: Sequence[int]) -> Set[int]:
+        vs_set = set(vs)
+        result = self.edges_collection.find(filter={
+            'node': {'$in': list(vs_set)},
+        }, projection={
+            '_id': 0,
+            'out.v': 1,
+            'in.v': 1,
+        }, session=self.session)
+        vs_unique = set()
+        for doc in result:
+            vs_unique.update(entry['v'] for entry in doc.get('out', []))
+            vs_unique.update(entry['v'] for entry in doc.get('in', []))
+        return vs_unique.difference(vs_set)
+
+# region Traversals
+
+    def bfs(self, v: int, max_depth: int) -> Dict[int, int]:
+        # `$graphLookup` can't follow IDs nested in arrays of sub-documents,
+        # but every level is still a single indexed lookup by `node`.
+        return BaseAPI.bfs(self, v, max_depth)
+
+# region Batch Reads
+
+    def reduce_edges_many(self, us, vs, key=None) -> Tuple[np.ndarray, np.ndarray]:
+        return BaseAPI.reduce_edges_many(self, us, vs, key)
+
+    def neighbors_many(self, ns) -> Tuple[np.ndarray, np.ndarray]:
+        ns = self.make_node_ids_array(ns)
+        result = self.edges_collection.find(filter={
+            'node': {'$in': np.unique(ns).tolist()},
+        }, projection={
+            '_id': 0,
+            'node': 1,
+            'out.v': 1,
+            'in.v': 1,
+        }, session=self.session)
+        members = []
+        for doc in result:
+            n = doc['node']
+            members.extend((n, entry['v']) for entry in doc.get('out', []))
+            members.extend((entry['v'], n) for entry in doc.get('in', []))
+        members = np.asarray(members, dtype=np.int64).reshape((-1, 2))
+        return self.group_neighbors(ns, members[:, 0], members[:, 1])
+
+# region Random Writes
+
+    def add(self, obj, upsert=True) -> int:
+        if isinstance(obj, Edge):
+            return self.add_rows([obj.__dict__], upsert=upsert)
+        elif isinstance(obj, EdgeBatch):
+            return self.add_rows(obj.to_dicts(), upsert=upsert)
+        elif is_sequence_of(obj, Edge):
+            return self.add_rows([o.__dict__ for o in obj], upsert=upsert)
+        return super().add(obj, upsert=upsert)
+
+    def add_rows(self, rows: Sequence[dict], upsert=True) -> int:
+        """
+            Appends entries to the last bucket of every affected node
+            and opens new buckets once it's full, all in a single `bulk_write`.
+        """
+        if len(rows) == 0:
+            return 0
+        if upsert:
+            self.remove_ids([row['_id'] for row in rows if row['_id'] >= 0])
+
+        entries = collections.defaultdict(list)
+        for row in rows:
+            entries[(row['first'], 'out')].append(
+                self.entry_of_edge(row, row['second']))
+            entries[(row['second'], 'in')].append(
+                self.entry_of_edge(row, row['first']))
+
+        with self.buckets_lock:
+            self.append_entries(entries)
+        return len(rows)
+
+    def append_entries(self, entries: Dict[Tuple[int, str], List[dict]]):
+        """
+            Plans the buckets of new `(node, side)` entries from the current
+            counters and pushes them. Must be called under `buckets_lock`.
+        """
+        cap = type(self).__max_bucket_size__
+        lasts = self.last_buckets({n for n, _ in entries.keys()})
+        updates = collections.defaultdict(lambda: collections.defaultdict(dict))
+        for (n, side), new_entries in entries.items():
+            bucket, cnt = lasts.get(n, (0, 0))
+            for entry in new_entries:
+                if cnt >= cap:
+                    bucket += 1
+                    cnt = 0
+                update = updates[self.bucket_id(n, bucket)]
+                update['$setOnInsert']['node'] = n
+                update['$inc']['cnt'] = update['$inc'].get('cnt', 0) + 1
+                pushed = update['$push'].setdefault(
+                    side, {'$each': [], '$sort': {'v': 1}})
+                pushed['$each'].append(entry)
+                cnt += 1
+            lasts[n] = (bucket, cnt)
+            if bucket > 0:
+                updates[n]['$setOnInsert']['node'] = n
+                updates[n]['$max']['buckets'] = bucket
+
+        ops = [
+            UpdateOne(
+                filter={'_id': _id},
+                update={operator: dict(fields) for operator, fields in update.items()},
+                upsert=True,
+            )
+            for _id, update in updates.items()
+        ]
+        self.edges_collection.bulk_write(
+            requests=ops, ordered=False, session=self.session)
+
+    def write_edges(self, es, upsert=True) -> Tuple[int, list]:
+        if isinstance(es, EdgeBatch):
+            return self.add_rows(es.to_dicts(), upsert=upsert), []
+        return self.add_rows([e.__dict__ for e in es], upsert=upsert), []
+
+    def remove(self, obj) -> int:
+        if isinstance(obj, Edge):
+            return self.remove_edges([obj])
+        elif isinstance(obj, EdgeBatch):
+            return self.remove_edges(obj.to_edges())
+        elif is_sequence_of(obj, Edge):
+            return self.remove_edges(obj)
+        return super().remove(obj)
+
+    def remove_edges(self, es: Sequence[Edge]) -> int:
+        ids = [e._id for e in es if e._id >= 0]
+        # Edges without IDs are resolved by their exact members.
+        for e in es:
+            if e._id >= 0:
+                continue
+            ids.extend(found._id for found in self.has_edge(e.first, e.second)
+                       if found.first == e.first and found.second == e.second)
+        return self.remove_ids(ids)
+
+    def remove_ids(self, ids: Sequence[int]) -> int:
+        if len(ids) == 0:
+            return 0
+        ids = list(set(ids))
+        result = self.edges_collection.aggregate(pipeline=[
+            {'$match': {'out.e': {'$in': ids}}},
+            {'$unwind': '$out'},
+            {'$match': {'out.e': {'$in': ids}}},
+            {'$project': {'_id': 0, 'first': '$node', 'second': '$out.v'}},
+        ], session=self.session)
+        firsts = set()
+        seconds = set()
+        cnt_removed = 0
+        for doc in result:
+            firsts.add(doc['first'])
+            seconds.add(doc['second'])
+            cnt_removed += 1
+        self.pull_entries(firsts, 'out', {'$in': ['$$entry.e', ids]})
+        self.pull_entries(seconds, 'in', {'$in': ['$$entry.e', ids]})
+        return cnt_removed
+
+    def remove_node(self, n) -> int:
+        n = self.make_node_id(n)
+        ids = set()
+        related = set()
+        for doc in self.adjacency_docs(n, ['out', 'in']):
+            for entry in [*doc.get('out', []), *doc.get('in', [])]:
+                ids.add(entry['e'])
+                related.add(entry['v'])
+        related.discard(n)
+        MongoDB.remove(self, self.make_node(n))
+        self.pull_entries(related, 'out', {'$eq': ['$$entry.v', n]})
+        self.pull_entries(related, 'in', {'$eq': ['$$entry.v', n]})
+        self.edges_collection.delete_many(
+            filter={'node': n}, session=self.session)
+        return len(ids)
+
+# region Helpers
+
+    def bucket_id(self, n: int, bucket: int):
+        return n if bucket == 0 else f'{n}:{bucket}'
+
+    def adjacency_docs(self, n: int, sides: Sequence[str]) -> List[dict]:
+        """
+            Fetches the primary document of a node by `_id` and,
+            only for high-degree nodes, its overflow buckets.
+        """
+        projection = {side: 1 for side in sides}
+        primary = self.edges_collection.find_one(
+            {'_id': n},
+            dict(projection, buckets=1),
+            session=self.session,
+        )
+        if primary is None:
+            return []
+        cnt_buckets = primary.get('buckets', 0)
+        if cnt_buckets == 0:
+            return [primary]
+        overflow = self.edges_collection.find(
+            {'_id': {'$in': [self.bucket_id(n, b) for b in range(1, cnt_buckets + 1)]}},
+            projection,
+            session=self.session,
+        )
+        return [primary, *overflow]
+
+    def last_buckets(self, ns: Set[int]) -> Dict[int, Tuple[int, int]]:
+        """
+            Maps every node to the number of its last bucket
+            and the number of entries in it.
+        """
+        lasts = dict()
+        for doc in self.edges_collection.find(
+                {'_id': {'$in': list(ns)}},
+                {'buckets': 1, 'cnt': 1},
+                session=self.session):
+            lasts[doc['_id']] = (doc.get('buckets', 0), doc.get('cnt', 0))
+        overflown = [self.bucket_id(n, bucket)
+                     for n, (bucket, _) in lasts.items() if bucket > 0]
+        if len(overflown):
+            for doc in self.edges_collection.find(
+                    {'_id': {'$in': overflown}},
+                    {'node': 1, 'cnt': 1},
+                    session=self.session):
+                lasts[doc['node']] = (lasts[doc['node']][0], doc.get('cnt', 0))
+        return lasts
+
+    def entry_of_edge(self, as_dict: dict, other: int) -> dict:
+        entry = {
+            'v': other,
+            'w': as_dict['weight'],
+            'e': as_dict['_id'],
+            'l': as_dict['label'],
+            'd': as_dict['is_directed'],
+        }
+        if as_dict.get('payload'):
+            entry['p'] = as_dict['payload']
+        return entry
+
+    def edge_from_doc(self, doc: dict) -> Edge:
+        if not doc.get('payload'):
+            doc.pop('payload', None)
+        return Edge(**doc)
+
+    def pull_entries(self, ns: Set[int], side: str, condition: dict):
+        """
+            Filters out entries matching the `condition` from one side
+            of every document of the given nodes and recounts their sizes.
+        """
+        if len(ns) == 0:
+            return
+        self.edges_collection.update_many({'node': {'$in': list(ns)}}, [
+            {'$set': {side: {'$filter': {
+                'input': {'$ifNull': [f'${side}', []]},
+                'as': 'entry',
+                'cond': {'$not': [condition]},
+            }}}},
+            {'$set': {'cnt': {'$add': [
+                {'$size': {'$ifNull': ['$out', []]}},
+                {'$size': {'$ifNull': ['$in', []]}},
+            ]}}},
+        ], session=self.session)
+
+    def nodes_to_unwind(self, u, v) -> Optional[List[int]]:
+        # Every edge containing a node is listed in one of its arrays,
+        # so a single known member is enough to narrow the search.
+        u = self.make_node_id(u)
+        v = self.make_node_id(v)
+        if u >= 0:
+            return [u]
+        if v >= 0:
+            return [v]
+        return None
+
+    def pipe_unwind_edges(self, ns: Optional[List[int]] = None) -> List[dict]:
+        """
+            Expands adjacency documents into ones shaped like the documents
+            of the `edges` collection, so the `pipe_match_*` stages can be reused.
+            Without `ns` only the `out` arrays are expanded, producing every edge once.
+            Otherwise both arrays of the given nodes are expanded and deduplicated.
+        """
+        def pipe_map_side(side: str, first: str, second: str) -> dict:
+            return {'$map': {
+                'input': {'$ifNull': [f'${side}', []]},
+                'as': 'entry',
+                'in': {
+                    '_id': '$$entry.e',
+                    'first': first,
+                    'second': second,
+                    'weight': '$$entry.w',
+                    'label': '$$entry.l',
+                    'is_directed': '$$entry.d',
+                    'payload': '$$entry.p',
+                },
+            }}
+
+        outs = pipe_map_side('out', '$node', '$$entry.v')
+        if ns is None:
+            return [
+                {'$project': {'_id': 0, 'edges': outs}},
+                {'$unwind': '$edges'},
+                {'$replaceRoot': {'newRoot': '$edges'}},
+            ]
+        ins = pipe_map_side('in', '$$entry.v', '$node')
+        return [
+            {'$match': {'node': {'$in': ns}}},
+            {'$project': {'_id': 0, 'edges': {'$concatArrays': [outs, ins]}}},
+            {'$unwind': '$edges'},
+            {'$group': {'_id': '$edges._id', 'edge': {'$first': '$edges'}}},
+            {'$replaceRoot': {'newRoot': '$edge'}},
+        ]
@@ -1,9 +1,18 @@
+import os
+
+from sqlalchemy.dialects import mysql
+
 from PyStorageGraph.BaseSQL import *
 
 
 class MySQL(BaseSQL):
 
+    __max_query_params__ = 65535
+
     def __init__(self, url, **kwargs):
+        # Allows the driver to send local files in `add_from_csv`.
+        if 'local_infile' not in url:
+            url += ('&' if '?' in url else '?') + 'local_infile=1'
         BaseSQL.__init__(self, url, **kwargs)
         self.set_pragmas_on_first_launch()
 
@@ -43,25 +52,58 @@ class MySQL(BaseSQL):
                 s.execute(p)
                 s.commit()
 
-    # def add_from_csv(self, path: str) -> int:
-    #     """
-    #         This method requires the file to be mounted on the same filesystem.
-    #         Unlike Postgres the connection wrapper doesn't allow channeling data to remote DB.
-    #     """
-    #     cnt = self.number_of_edges()
-    #     pattern = '''
-    #     LOAD DATA LOCAL INFILE  '%s'
-    #     INTO TABLE %s
-    #     FIELDS TERMINATED BY ','
-    #     LINES TERMINATED BY '\n'
-    #     IGNORE 1 ROWS
-    #     (first, second, weight);
-    #     '''
-    #     task = pattern % (path, EdgeNewSQL.__tablename__)
-    #     with self.get_session() as s:
-    #         s.execute(task)
-    #         s.commit()
-    #     self.upsert_table(EdgeNewSQL.__tablename__)
-    #     self.clear_table(EdgeNewSQL.__tablename__)
-    #     self.add_missing_nodes()
-    #     return self.number_of_edges() - cnt
+    def add_from_csv(self, filepath: str, upsert=True) -> int:
+        """
+            Loads the original CSV file into the staging table with `LOAD DATA LOCAL INFILE`,
+            generating IDs after `biggest_edge_id()` and defaulting missing weights to 1.
+            The file is read by the client, so the DB may be remote,
+            but the driver must be allowed to send it with the `local_infile` option.
+        """
+        cnt = self.number_of_edges()
+        self.clear_table(EdgeNewSQL.__tablename__)
+        escaped_path = os.path.abspath(filepath).replace(
+            '\\', '\\\\').replace("'", "\\'")
+        task = f'''
+            LOAD DATA LOCAL INFILE '{escaped_path}'
+            INTO TABLE {EdgeNewSQL.__tablename__}
+            FIELDS TERMINATED BY ','
+            LINES TERMINATED BY '\\n'
+            IGNORE 1 ROWS
+            (@first, @second, @weight)
+            SET
+                _id = (@row_id := @row_id + 1),
+                first = NULLIF(TRIM(@first), ''),
+                second = NULLIF(TRIM(@second), ''),
+                is_directed = TRUE,
+                weight = COALESCE(NULLIF(TRIM(@weight), ''), 1),
+                label = -1;
+        '''
+        # User variables are bound to the connection,
+        # so the counter must be initialized on the same one.
+        with self.engine.begin() as conn:
+            conn.execute(text('SET @row_id = :last_id;'),
+                         last_id=self.biggest_edge_id())
+            conn.execute(text(task))
+            # Lines without both endpoints are skipped by other parsers.
+            conn.execute(text(f'''
+                DELETE FROM {EdgeNewSQL.__tablename__}
+                WHERE first IS NULL OR second IS NULL;
+            '''))
+
+        if upsert:
+            self.upsert_table(EdgeNewSQL.__tablename__)
+        else:
+            self.insert_table(EdgeNewSQL.__tablename__)
+        self.clear_table(EdgeNewSQL.__tablename__)
+        self.add_missing_nodes()
+        return self.number_of_edges() - cnt
+
+    def upsert_statement(self, table: Table):
+        # https://docs.sqlalchemy.org/en/13/dialects/mysql.html#insert-on-duplicate-key-update-upsert
+        q = mysql.insert(table)
+        return q.on_duplicate_key_update(
+            {c.name: q.inserted[c.name] for c in table.columns if c.name != '_id'})
+
+    def upsert_table(self, source_name: str):
+        # `REPLACE INTO` is native to MySQL.
+        return BaseSQL.upsert_table(self, source_name)
@@ -1,10 +1,12 @@
 import os
 import shutil
+from contextlib import contextmanager
 from typing import List, Optional, Dict, Generator, Set, Tuple, Sequence
 from urllib.parse import urlparse
 
 from neo4j import GraphDatabase
 from neo4j import BoltStatementResult
+import numpy as np
 
 from PyStorageHelpers import *
 from PyStorageGraph.BaseAPI import BaseAPI
@@ -72,6 +74,8 @@ class Neo4J(BaseAPI):
             password=url_obj.password,
         )
         self.session = self.driver.session()
+        # Explicit transaction opened by `transaction()`.
+        self.tx = None
 
         # Resolve the name (for CAUTION 2):
         name = str()
@@ -96,13 +100,46 @@ class Neo4J(BaseAPI):
                 if enterprise_edition:
                     self.create_constraint_edges()
 
+    def run(self, task: str, **params):
+        """
+            Runs the query in the explicit transaction, if one is open,
+            or in an auto-commit transaction of the session otherwise.
+        """
+        if self.tx is not None:
+            return self.tx.run(task, **params)
+        return self.session.run(task, **params)
+
+    @contextmanager
+    def transaction(self):
+        """
+            Opens an explicit transaction, so all the queries within
+            the block are committed together, instead of one by one.
+
+            CAUTION:
+            Schema changes, like creating indexes or constraints,
+            can't be mixed with data updates in the same transaction.
+        """
+        if self.tx is not None:
+            yield self
+            return
+
+        self.tx = self.session.begin_transaction()
+        try:
+            yield self
+            self.tx.commit()
+        except Exception as e:
+            self.tx.rollback()
+            raise e
+        finally:
+            self.tx = None
+
     def get_constraints(self) -> List[str]:
-        cs = list(self.session.run('CALL db.constraints').records())
+        cs = list(self.run('CALL db.constraints').records())
         names = [c.get('name', '') for c in cs]
         return names
 
     def get_indexes(self) -> List[str]:
-        cs = list(self.session.run('CALL db.indexes').records())
+        cs = list(self.run('CALL db.indexes').records())
         names = [c.get('name', '') for c in cs]
         return names
 
@@ -116,7 +153,7 @@ class Neo4J(BaseAPI):
         # task = 'CALL db.createIndex(":VERTEX(_id)", "native-btree-1.0", )'
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return self.session.run(task)
+        return self.run(task)
 
     def create_constraint_nodes(self):
         # Existing uniqness constraint means,
@@ -129,7 +166,7 @@ class Neo4J(BaseAPI):
         '''
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return self.session.run(task)
+        return self.run(task)
 
     def create_constraint_edges(self):
         # Edge uniqness constrains are only availiable to Enterprise Edition customers.
@@ -148,128 +185,226 @@ class Neo4J(BaseAPI):
         # '''
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return self.session.run(task)
+        return self.run(task)
 
     # Relatives
 
+    def has_node(self, n) -> Optional[Node]:
+        task = '''
+        MATCH (v:VERTEX {_id: $id})
+        RETURN v._id AS _id
+        LIMIT 1
+        '''
+        task = task.replace('VERTEX', self._v)
+        _id = self._first_record(self.run(task, id=self.make_node_id(n)), '_id')
+        if _id is None:
+            return None
+        return Node(_id=int(_id))
+
     def has_edge(self, first: int, second: int) -> Optional[Edge]:
         if self.directed:
             pattern = '''
-            MATCH (first:VERTEX {_id: %d})-[e:EDGE]->(second:VERTEX {_id: %d})
-            RETURN first._id, second._id, e.weight
+            MATCH (first:VERTEX {_id: $first})-[e:EDGE]->(second:VERTEX {_id: $second})
+            RETURN e._id, first._id, second._id, e.weight
             '''
         else:
             pattern = '''
-            MATCH (first:VERTEX {_id: %d})-[e:EDGE]-(second:VERTEX {_id: %d})
-            RETURN first._id, second._id, e.weight
+            MATCH (first:VERTEX {_id: $first})-[e:EDGE]-(second:VERTEX {_id: $second})
+            RETURN e._id, first._id, second._id, e.weight
             '''
-        task = pattern % (first, second)
-        task = task.replace('VERTEX', self._v)
+        task = pattern.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return self._records_to_edges(self.session.run(task))
+        return self._records_to_edges(self.run(task, first=first, second=second))
 
     def edges_from(self, v: int) -> List[Edge]:
-        pattern = '''
-        MATCH (first:VERTEX {_id: %d})-[e:EDGE]->(second:VERTEX)
-        RETURN first._id, second._id, e.weight
+        task = '''
+        MATCH (first:VERTEX {_id: $id})-[e:EDGE]->(second:VERTEX)
+        RETURN e._id, first._id, second._id, e.weight
         '''
-        task = pattern % (v)
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return self._records_to_edges(self.session.run(task))
+        return self._records_to_edges(self.run(task, id=v))
 
     def edges_to(self, v: int) -> List[Edge]:
-        pattern = '''
-        MATCH (first:VERTEX)-[e:EDGE]->(second:VERTEX {_id: %d})
-        RETURN first._id, second._id, e.weight
+        task = '''
+        MATCH (first:VERTEX)-[e:EDGE]->(second:VERTEX {_id: $id})
+        RETURN e._id, first._id, second._id, e.weight
         '''
-        task = pattern % (v)
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return self._records_to_edges(self.session.run(task))
+        return self._records_to_edges(self.run(task, id=v))
 
     def edges_related(self, v: int) -> List[Edge]:
-        pattern = '''
-        MATCH (first:VERTEX {_id: %d})-[e:EDGE]-(second:VERTEX)
-        RETURN first._id, second._id, e.weight
+        task = '''
+        MATCH (first:VERTEX {_id: $id})-[e:EDGE]-(second:VERTEX)
+        RETURN e._id, first._id, second._id, e.weight
         '''
-        task = pattern % (v)
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return self._records_to_edges(self.session.run(task))
+        return self._records_to_edges(self.run(task, id=v))
 
     # Wider range of neighbors
 
     def edges_related_to_group(self, vs: Sequence[int]) -> List[Edge]:
-        pattern = '''
+        task = '''
         MATCH (first:VERTEX)-[e:EDGE]-(second:VERTEX)
-        WHERE (first._id IN [%s]) AND NOT (second._id IN [%s])
-        RETURN first._id, second._id, e.weight
+        WHERE (first._id IN $ids) AND NOT (second._id IN $ids)
+        RETURN e._id, first._id, second._id, e.weight
         '''
-        group_members = ','.join([str(v) for v in vs])
-        task = pattern % (group_members, group_members)
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return self._records_to_edges(self.session.run(task))
+        return self._records_to_edges(self.run(task, ids=list(vs)))
 
     def neighbors_of_group(self, vs: Sequence[int]) -> Set[int]:
-        pattern = '''
+        task = '''
         MATCH (first:VERTEX)-[:EDGE]-(second:VERTEX)
-        WHERE (first._id IN [%s]) AND NOT (second._id IN [%s])
+        WHERE (first._id IN $ids) AND NOT (second._id IN $ids)
         RETURN second._id as _id
         '''
-        group_members = ','.join([str(v) for v in vs])
-        task = pattern % (group_members, group_members)
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return {int(r['_id']) for r in self.session.run(task).records()}
+        return {int(r['_id']) for r in self.run(task, ids=list(vs)).records()}
 
     def neighbors(self, v: int) -> Set[int]:
-        pattern = '''
-        MATCH (:VERTEX {_id: %d})-[:EDGE]-(v_related:VERTEX)
+        task = '''
+        MATCH (:VERTEX {_id: $id})-[:EDGE]-(v_related:VERTEX)
         RETURN v_related._id as _id
         '''
-        task = pattern % (v)
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return {int(r['_id']) for r in self.session.run(task).records()}
+        return {int(r['_id']) for r in self.run(task, id=v).records()}
 
     def neighbors_of_neighbors(self, v: int, include_related=False) -> Set[int]:
         if include_related:
-            pattern = '''
-            MATCH (v:VERTEX {_id: %d})-[:EDGE]-(:VERTEX)-[:EDGE]-(v_unrelated:VERTEX)
+            task = '''
+            MATCH (v:VERTEX {_id: $id})-[:EDGE]-(:VERTEX)-[:EDGE]-(v_unrelated:VERTEX)
             WHERE NOT (v._id = v_unrelated._id)
             RETURN v_unrelated._id as _id
             '''
-            task = pattern % v
         else:
-            pattern = '''
-            MATCH (v:VERTEX {_id: %d})-[:EDGE]-(:VERTEX)-[:EDGE]-(v_unrelated:VERTEX)
+            task = '''
+            MATCH (v:VERTEX {_id: $id})-[:EDGE]-(:VERTEX)-[:EDGE]-(v_unrelated:VERTEX)
             WHERE NOT EXISTS {
                 MATCH (v)-[e_banned:EDGE]-(v_unrelated)
             } AND NOT (v._id = v_unrelated._id)
             RETURN v_unrelated._id as _id
             '''
-            task = pattern % v
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return {int(r['_id']) for r in self.session.run(task).records()}
+        return {int(r['_id']) for r in self.run(task, id=v).records()}
 
     def shortest_path(self, first, second) -> (List[int], float):
-        pattern = '''
-        MATCH (first:VERTEX {_id: %d}), (second:VERTEX {_id: %d})
+        task = '''
+        MATCH (first:VERTEX {_id: $first}), (second:VERTEX {_id: $second})
         CALL algo.shortestPath.stream(first, second, "weight")
         YIELD nodeId, weight
-        MATCH (v_on_path:Loc) WHERE id(v_on_path) = nodeId
+        MATCH (v_on_path:VERTEX) WHERE id(v_on_path) = nodeId
         RETURN v_on_path._id AS _id, weight
         '''
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        rs = list(self.session.run(task).records())
+        rs = list(self.run(task, first=first, second=second).records())
         path = [int(r['_id']) for r in rs]
         weight = sum([float(r['weight']) for r in rs])
         return path, weight
 
+    # Batches
+
+    def reduce_edges_many(self, us, vs, key=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Answers the whole batch with one parametrized query,
+            where every kind of aggregation is a separate `UNWIND` branch.
+            A non-negative `key` only counts edges with that `label` property.
+            Edges written without labels don't have it and never match.
+        """
+        us, vs = self.make_node_ids_pairs(us, vs)
+        split = self.split_pairs(us, vs)
+        parts = [
+            '''
+            UNWIND $pairs AS pair
+            MATCH (first:VERTEX {_id: pair[0]})-[e:EDGE]->(second:VERTEX {_id: pair[1]})
+            WHERE $key < 0 OR e.label = $key
+            RETURN 0 AS kind, pair[0] AS a, pair[1] AS b, count(e) AS c, sum(e.weight) AS w
+            ''',
+            '''
+            UNWIND $outs AS id
+            MATCH (first:VERTEX {_id: id})-[e:EDGE]->(:VERTEX)
+            WHERE $key < 0 OR e.label = $key
+            RETURN 1 AS kind, id AS a, -1 AS b, count(e) AS c, sum(e.weight) AS w
+            ''',
+            '''
+            UNWIND $ins AS id
+            MATCH (:VERTEX)-[e:EDGE]->(second:VERTEX {_id: id})
+            WHERE $key < 0 OR e.label = $key
+            RETURN 2 AS kind, -1 AS a, id AS b, count(e) AS c, sum(e.weight) AS w
+            ''',
+            '''
+            UNWIND $loops AS id
+            MATCH (v:VERTEX {_id: id})-[e:EDGE]->(v)
+            WHERE $key < 0 OR e.label = $key
+            RETURN 3 AS kind, id AS a, id AS b, count(e) AS c, sum(e.weight) AS w
+            ''',
+        ]
+        if split['total']:
+            parts.append('''
+            MATCH (:VERTEX)-[e:EDGE]->(:VERTEX)
+            WHERE $key < 0 OR e.label = $key
+            RETURN 4 AS kind, -1 AS a, -1 AS b, count(e) AS c, sum(e.weight) AS w
+            ''')
+        task = 'UNION ALL'.join(parts)
+        task = task.replace('VERTEX', self._v)
+        task = task.replace('EDGE', self._e)
+        pairs = np.stack((split['pair_us'], split['pair_vs']), axis=1)
+        rs = self.run(
+            task,
+            pairs=np.unique(pairs, axis=0).tolist(),
+            outs=split['outs'].tolist(),
+            ins=split['ins'].tolist(),
+            loops=split['loops'].tolist(),
+            key=self.make_label(key),
+        )
+
+        groups = [dict() for _ in range(5)]
+        for r in rs.records():
+            kind = r['kind']
+            member = (r['a'], r['b']) if kind == 0 else (
+                r['b'] if kind == 2 else r['a'])
+            groups[kind][member] = (int(r['c']), float(r['w'] or 0))
+        return self.assemble_reduced(
+            us, vs,
+            pairs=groups[0],
+            outs=groups[1],
+            ins=groups[2],
+            loops=groups[3],
+            total=groups[4].get(-1, (0, 0)),
+        )
+
+    def neighbors_many(self, ns) -> Tuple[np.ndarray, np.ndarray]:
+        ns = self.make_node_ids_array(ns)
+        task = '''
+        UNWIND $ids AS id
+        MATCH (:VERTEX {_id: id})-[:EDGE]-(v_related:VERTEX)
+        RETURN id AS first, v_related._id AS second
+        '''
+        task = task.replace('VERTEX', self._v)
+        task = task.replace('EDGE', self._e)
+        rs = self.run(task, ids=np.unique(ns).tolist())
+        members = [(r['first'], r['second']) for r in rs.records()]
+        members = np.asarray(members, dtype=np.int64).reshape((-1, 2))
+        return self.group_neighbors(ns, members[:, 0], members[:, 1])
+
+    def has_nodes(self, ns) -> List[Optional[Node]]:
+        ns = self.make_node_ids_array(ns)
+        task = '''
+        UNWIND $ids AS id
+        MATCH (v:VERTEX {_id: id})
+        RETURN DISTINCT v._id AS _id
+        '''
+        task = task.replace('VERTEX', self._v)
+        rs = self.run(task, ids=np.unique(ns).tolist())
+        found = {int(r['_id']) for r in rs.records()}
+        return [Node(_id=n) if n in found else None for n in ns.tolist()]
+
     # Metadata
 
     def reduce_nodes(self) -> int:
@@ -278,7 +413,7 @@ class Neo4J(BaseAPI):
         WITH count(v) as result
         RETURN result
         '''
-        return int(self._first_record(self.session.run(task), 'result'))
+        return int(self._first_record(self.run(task), 'result'))
 
     def reduce_edges(self) -> int:
         task = f'''
@@ -286,46 +421,43 @@ class Neo4J(BaseAPI):
         WITH count(e) as result
         RETURN result
         '''
-        return int(self._first_record(self.session.run(task), 'result'))
+        return int(self._first_record(self.run(task), 'result'))
 
     def degree_neighbors(self, v: int) -> (int, float):
-        pattern = '''
-        MATCH (v:VERTEX {_id: %d})-[e:EDGE]-()
+        task = '''
+        MATCH (v:VERTEX {_id: $id})-[e:EDGE]-()
         WITH count(e) as c, sum(e.weight) as s
         RETURN c, s
         '''
-        task = pattern % v
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        rs = list(self.session.run(task).records())
+        rs = list(self.run(task, id=v).records())
         c = int(self._first_record(rs, 'c'))
         s = float(self._first_record(rs, 's'))
         return c, s
 
     def degree_predecessors(self, v: int) -> (int, float):
-        pattern = '''
-        MATCH (:VERTEX)-[e:EDGE]->(v:VERTEX {_id: %d})
+        task = '''
+        MATCH (:VERTEX)-[e:EDGE]->(v:VERTEX {_id: $id})
         WITH count(e) as c, sum(e.weight) as s
         RETURN c, s
         '''
-        task = pattern % v
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        rs = list(self.session.run(task).records())
+        rs = list(self.run(task, id=v).records())
         c = int(self._first_record(rs, 'c'))
         s = float(self._first_record(rs, 's'))
         return c, s
 
     def degree_successors(self, v: int) -> (int, float):
-        pattern = '''
-        MATCH (v:VERTEX {_id: %d})-[e:EDGE]->(:VERTEX)
+        task = '''
+        MATCH (v:VERTEX {_id: $id})-[e:EDGE]->(:VERTEX)
         WITH count(e) as c, sum(e.weight) as s
         RETURN c, s
         '''
-        task = pattern % v
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        rs = list(self.session.run(task).records())
+        rs = list(self.run(task, id=v).records())
         c = int(self._first_record(rs, 'c'))
         s = float(self._first_record(rs, 's'))
         return c, s
@@ -339,121 +471,152 @@ class Neo4J(BaseAPI):
         '''
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        rs = list(self.session.run(task).records())
+        rs = list(self.run(task).records())
         if len(rs) == 0:
             return 0
         return int(self._first_record(rs, '_id'))
 
-    def add(self, e: Edge) -> bool:
+    def add(self, obj, upsert=True) -> int:
         """
             CAUTION: True Upserting is too slow, if indexing isn't enabled,
             as we need to perform full scans to match each edge ID!
             So for the non-enterprise version - we strongly recommend 
             using `insert_edge()`
         """
+        if isinstance(obj, Edge):
+            return self.add([obj], upsert=upsert) == 1
+        elif isinstance(obj, EdgeBatch):
+            return self.add(obj.to_edges(), upsert=upsert)
+        elif is_sequence_of(obj, Edge):
+            if not upsert:
+                return self.insert_edges(obj)
+            return self.upsert_edges(obj)
+        return super().add(obj, upsert=upsert)
+
+    def upsert_edges(self, es: List[Edge]) -> int:
+        """
+            Merges the batch with one `UNWIND` query per direction,
+            so every shape is compiled once, just like in `insert_edges`.
+        """
         pattern = '''
-        MERGE (first:VERTEX {_id: %d})
-        MERGE (second:VERTEX {_id: %d})
-        MERGE (first)-[:EDGE {_id: %d, weight: %d}]%s(second)
+        UNWIND $rows AS row
+        MERGE (first:VERTEX {_id: row.first})
+        MERGE (second:VERTEX {_id: row.second})
+        MERGE (first)-[e:EDGE {_id: row._id}]%s(second)
+        SET e.weight = row.weight, e.label = row.label
         '''
-        d = '->' if e.is_directed else '-'
-        task = pattern % (e.first, e.second, e._id, e.weight, d)
-        task = task.replace('VERTEX', self._v)
-        task = task.replace('EDGE', self._e)
-        self.session.run(task)
-        return True
+        for is_directed in (True, False):
+            rows = [{
+                '_id': e._id,
+                'first': e.first,
+                'second': e.second,
+                'weight': float(e.weight),
+                'label': int(e.label),
+            } for e in es if bool(e.is_directed) == is_directed]
+            if len(rows) == 0:
+                continue
+            task = pattern % ('->' if is_directed else '-')
+            task = task.replace('VERTEX', self._v)
+            task = task.replace('EDGE', self._e)
+            self.run(task, rows=rows)
+        return len(es)
 
     def insert_edge(self, e: Edge) -> bool:
-        pattern = '''
-        MERGE (first:VERTEX {_id: %d})
-        MERGE (second:VERTEX {_id: %d})
-        CREATE (first)-[:EDGE {_id: %d, weight: %d}]%s(second)
-        '''
-        d = '->' if e.is_directed else '-'
-        task = pattern % (e.first, e.second, e._id, e.weight, d)
-        task = task.replace('VERTEX', self._v)
-        task = task.replace('EDGE', self._e)
-        self.session.run(task)
-        return True
+        return self.insert_edges([e]) == 1
 
     def insert_edges(self, es: List[Edge]) -> int:
-        vs = set()
-        for e in es:
-            vs.insert(e.first)
-            vs.insert(e.second)
-        task = str()
-        # First upsert all the nodes.
-        for v in vs:
-            pattern = 'MERGE (v%d:VERTEX {_id: %d})'
-            part = (pattern % (v, v))
-            task += part
-            task += '\n'
-        # Then add the edges connecting matched nodes.
-        for e in es:
-            pattern = 'CREATE (v%d)-[:EDGE {_id: %d, weight: %d}]%s(v%d)'
-            d = '->' if e.is_directed else '-'
-            part = (pattern %
-                    (e.first, e._id, e.weight, d, e.second))
-            task += part
-            task += '\n'
+        """
+            Sends the batch as a list of parameters, so the query
+            is compiled once and reused from the plan cache,
+            instead of building a giant query with a clause per edge.
+            https://neo4j.com/docs/cypher-manual/current/clauses/unwind/
+        """
+        # Undirected relationships can't be created in Neo4J,
+        # so they are stored in the original direction and matched with `-`.
+        task = '''
+        UNWIND $rows AS row
+        MERGE (first:VERTEX {_id: row.first})
+        MERGE (second:VERTEX {_id: row.second})
+        CREATE (first)-[:EDGE {_id: row._id, weight: row.weight, label: row.label}]->(second)
+        '''
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        self.session.run(task)
+        rows = [{
+            '_id': e._id,
+            'first': e.first,
+            'second': e.second,
+            'weight': float(e.weight),
+            'label': int(e.label),
+        } for e in es]
+        self.run(task, rows=rows)
         return len(es)
 
     def remove_node(self, v: int):
-        pattern = '''
-        MATCH (v:VERTEX {_id: %d})
+        task = '''
+        MATCH (v:VERTEX {_id: $id})
         DETACH DELETE v
         '''
-        task = pattern % v
         task = task.replace('VERTEX', self._v)
         task = task.replace('EDGE', self._e)
-        return self.session.run(task)
+        return self.run(task, id=v)
 
     def remove(self, e: Edge) -> bool:
-        task = str()
-        if e._id < 0:
-            pattern = '''
-            MATCH (first:VERTEX {_id: %d})
-            MATCH (second:VERTEX {_id: %d})
-            MATCH (first)-[e:EDGE]%s(second)
-            DELETE e
-            '''
-            d = '->' if e.is_directed else '-'
-            task = pattern % (e.first, e.second, d)
-        else:
-            # We provide excessive information on node IDs
-            # to use property indexes.
-            pattern = '''
-            MATCH (first:VERTEX {_id: %d})
-            MATCH (second:VERTEX {_id: %d})
-            MATCH (first)-[e:EDGE {_id: %d}]%s(second)
-            DELETE e
-            '''
-            d = '->' if e.is_directed else '-'
-            task = pattern % (e.first, e.second, e._id, d)
-        task = task.replace('VERTEX', self._v)
-        task = task.replace('EDGE', self._e)
-        self.session.run(task)
-        return True
+        if isinstance(e, Edge):
+            return self.remove_edges([e]) > 0
+        elif is_sequence_of(e, Edge):
+            return self.remove_edges(e)
+        return False
+
+    def remove_edges(self, es: Sequence[Edge]) -> int:
+        """
+            Deletes a batch of edges with at most four parametrized queries,
+            one per combination of the known ID and direction.
+        """
+        cnt_removed = 0
+        for by_id in [False, True]:
+            for is_directed in [False, True]:
+                rows = [{
+                    '_id': e._id,
+                    'first': e.first,
+                    'second': e.second,
+                } for e in es if (e._id >= 0) == by_id and e.is_directed == is_directed]
+                if len(rows) == 0:
+                    continue
+                # We provide excessive information on node IDs
+                # to use property indexes.
+                pattern = '''
+                UNWIND $rows AS row
+                MATCH (first:VERTEX {_id: row.first})
+                MATCH (second:VERTEX {_id: row.second})
+                MATCH (first)-[e:EDGE%s]%s(second)
+                DELETE e
+                RETURN count(*) AS c
+                '''
+                properties = ' {_id: row._id}' if by_id else ''
+                d = '->' if is_directed else '-'
+                task = pattern % (properties, d)
+                task = task.replace('VERTEX', self._v)
+                task = task.replace('EDGE', self._e)
+                cnt_removed += int(self._first_record(self.run(task, rows=rows), 'c') or 0)
+        return cnt_removed
 
     def clear(self):
-        self.session.run(f'MATCH (v:{self._v}) DETACH DELETE v')
+        self.run(f'MATCH (v:{self._v}) DETACH DELETE v')
         idxs = self.get_indexes()
         if f'index{self._v}' in idxs:
-            self.session.run(f'DROP INDEX index{self._v}')
+            self.run(f'DROP INDEX index{self._v}')
         cs = self.get_constraints()
         if f'constraint{self._v}' in cs:
-            self.session.run(f'DROP CONSTRAINT constraint{self._v}')
+            self.run(f'DROP CONSTRAINT constraint{self._v}')
         if f'constraint{self._e}' in cs:
-            self.session.run(f'DROP CONSTRAINT constraint{self._e}')
+            self.run(f'DROP CONSTRAINT constraint{self._e}')
 
-    def add_stream(self, stream) -> int:
+    def add_stream(self, stream, upsert=False) -> int:
+        # Plain inserts remain the default, as merging requires indexes to be fast.
         chunk_len = Neo4J.__max_batch_size__
         count_edges_added = 0
         for es in chunks(stream, chunk_len):
-            count_edges_added += self.insert_edges(es)
+            count_edges_added += self.add(es, upsert=upsert)
         return count_edges_added
 
     def add_from_csv(self, filepath: str, is_directed=True) -> int:
@@ -480,7 +643,7 @@ class Neo4J(BaseAPI):
             shutil.copy(filepath, file_link)
             # https://neo4j.com/docs/cypher-manual/current/clauses/load-csv/#load-csv-importing-large-amounts-of-data
             pattern_full = '''
-            LOAD CSV WITH HEADERS FROM '%s' AS row
+            LOAD CSV WITH HEADERS FROM $url AS row
             WITH
                 toInteger(row.first) AS id_from,
                 toInteger(row.second) AS id_to,
@@ -488,16 +651,13 @@ class Neo4J(BaseAPI):
                 toInteger(linenumber()) AS idx
             MERGE (first:VERTEX {_id: id_from})
             MERGE (second:VERTEX {_id: id_to})
-            CREATE (first)-[:EDGE {_id: idx + %d, weight: w}]%s(second)
+            CREATE (first)-[:EDGE {_id: idx + $first_id, weight: w}]%s(second)
             '''
             d = '->' if is_directed else '-'
-            task = pattern_full % (
-                'file:///' + filename, current_id, d
-            )
+            task = pattern_full % d
             task = task.replace('VERTEX', self._v)
             task = task.replace('EDGE', self._e)
-            print('task is:', task)
-            self.session.run(task)
+            self.run(task, url='file:///' + filename, first_id=current_id)
         finally:
             # Don't forget to copy temporary file!
             os.unlink(file_link)
@@ -528,7 +688,7 @@ class Neo4J(BaseAPI):
             # https://neo4j.com/docs/cypher-manual/current/clauses/load-csv/#load-csv-importing-large-amounts-of-data
             pattern_nodes = '''
             USING PERIODIC COMMIT %d
-            LOAD CSV WITH HEADERS FROM '%s' AS row
+            LOAD CSV WITH HEADERS FROM $url AS row
             WITH
                 toInteger(row.first) AS id_from,
                 toInteger(row.second) AS id_to
@@ -537,7 +697,7 @@ class Neo4J(BaseAPI):
             '''
             pattern_edges = '''
             USING PERIODIC COMMIT %d
-            LOAD CSV WITH HEADERS FROM '%s' AS row
+            LOAD CSV WITH HEADERS FROM $url AS row
             WITH
                 toInteger(row.first) AS id_from,
                 toInteger(row.second) AS id_to,
@@ -545,22 +705,19 @@ class Neo4J(BaseAPI):
                 toInteger(linenumber()) AS idx
             MATCH (first:VERTEX {_id: id_from})
             MATCH (second:VERTEX {_id: id_to})
-            CREATE (first)-[e:EDGE {_id: idx + %d, weight: w}]%s(second)
+            CREATE (first)-[e:EDGE {_id: idx + $first_id, weight: w}]%s(second)
             RETURN count(e)
             '''
             d = '->' if is_directed else '-'
+            # `PERIODIC COMMIT` only accepts a literal batch size.
             tasks = [
-                pattern_nodes % (
-                    Neo4J.__max_batch_size__, 'file:///' + filename
-                ),
-                pattern_edges % (
-                    Neo4J.__max_batch_size__, 'file:///' + filename, current_id, d
-                ),
+                pattern_nodes % Neo4J.__max_batch_size__,
+                pattern_edges % (Neo4J.__max_batch_size__, d),
             ]
             for task in tasks:
                 task = task.replace('VERTEX', self._v)
                 task = task.replace('EDGE', self._e)
-                self.session.run(task)
+                self.run(task, url='file:///' + filename, first_id=current_id)
         finally:
             # Don't forget to copy temporary file!
             os.unlink(file_link)
@@ -573,7 +730,12 @@ class Neo4J(BaseAPI):
     def _records_to_edges(self, records) -> List[Edge]:
         if isinstance(records, BoltStatementResult):
             records = list(records.records())
-        return [Edge(r['first._id'], r['second._id'], r['e.weight']) for r in records]
+        return [Edge(
+            _id=r['e._id'],
+            first=r['first._id'],
+            second=r['second._id'],
+            weight=r['e.weight'],
+        ) for r in records]
 
     def _first_record(self, records, key):
         if isinstance(records, BoltStatementResult):
@@ -1,3 +1,7 @@
+import io
+
+from sqlalchemy.dialects import postgresql
+
 from PyStorageGraph.BaseSQL import *
 
 
@@ -12,6 +16,8 @@ class PostgreSQL(BaseSQL):
             https://sqlalchemy-utils.readthedocs.io/en/latest/data_types.html#module-sqlalchemy_utils.types.json        
     """
 
+    __max_query_params__ = 32767
+
     def __init__(self, url, **kwargs):
         BaseSQL.__init__(self, url, **kwargs)
         self.set_pragmas_on_first_launch()
@@ -35,17 +41,120 @@ class PostgreSQL(BaseSQL):
                 s.execute(p)
                 s.commit()
 
-    # TODO: Change the IDs of imported entries.
-    # def upsert_bulk_from_path(self, path: str) -> int:
-    #     cnt = self.number_of_edges()
-    #     with open(path, 'r') as f:
-    #         conn = self.engine.raw_connection()
-    #         cursor = conn.cursor()
-    #         cmd = f'COPY {EdgeNewSQL.__tablename__} (first, second, weight) FROM STDIN WITH (FORMAT CSV, HEADER TRUE)'
-    #         cursor.copy_expert(cmd, f)
-    #         conn.commit()
-    #     self.upsert_table(EdgeNewSQL.__tablename__)
-    #     return self.number_of_edges() - cnt
+    def add_from_csv(self, filepath: str, upsert=True) -> int:
+        """
+            Parses the CSV in parallel and streams it through `COPY`.
+            Row numbers are replaced with new IDs following `biggest_edge_id()`.
+        """
+        first_id = self.biggest_edge_id() + 1
+        chunk_len = type(self).__max_batch_size__
+
+        def renumbered():
+            cnt_preceding = 0
+            for batch in yield_edges_from_csv(filepath, batch_size=chunk_len):
+                batch._id = np.arange(
+                    first_id + cnt_preceding,
+                    first_id + cnt_preceding + len(batch),
+                    dtype=np.int64,
+                )
+                cnt_preceding += len(batch)
+                yield batch
+
+        return self.add_stream(renumbered(), upsert=upsert)
+
+    def add_stream(self, stream, upsert=True) -> int:
+        """
+            Copies the stream into the staging table in binary format
+            and merges it into the main table with a single query.
+            Edges without IDs get new ones following `biggest_edge_id()`.
+        """
+        self.clear_table(EdgeNewSQL.__tablename__)
+        next_id = self.biggest_edge_id() + 1
+        chunk_len = type(self).__max_batch_size__
+        cmd = f'''
+            COPY {EdgeNewSQL.__tablename__} (_id, first, second, is_directed, weight, label)
+            FROM STDIN WITH (FORMAT BINARY)
+        '''
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            for es in chunks(stream, chunk_len):
+                batch = es if isinstance(
+                    es, EdgeBatch) else EdgeBatch.from_edges(es)
+                missing = batch._id < 0
+                cnt_missing = np.count_nonzero(missing)
+                if cnt_missing:
+                    batch._id = batch._id.copy()
+                    batch._id[missing] = np.arange(
+                        next_id, next_id + cnt_missing, dtype=np.int64)
+                    next_id += cnt_missing
+                # The file-like object is only read from, so a bytes buffer fits.
+                cursor.copy_expert(cmd, io.BytesIO(self.encode_copy_binary(batch)))
+            conn.commit()
+        finally:
+            conn.close()
+
+        # Import the new data.
+        cnt = self.number_of_edges()
+        if upsert:
+            self.upsert_table(EdgeNewSQL.__tablename__)
+        else:
+            self.insert_table(EdgeNewSQL.__tablename__)
+        self.clear_table(EdgeNewSQL.__tablename__)
+        self.add_missing_nodes()
+        return self.number_of_edges() - cnt
+
+    def encode_copy_binary(self, batch: EdgeBatch) -> bytes:
+        """
+            Serializes the batch into PostgreSQL binary `COPY` format, where every
+            row starts with the number of fields and every field with its length.
+            All of it is big-endian, so a single structured NumPy array is enough.
+            https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4
+        """
+        row_type = np.dtype([
+            ('cnt_fields', '>i2'),
+            ('len_id', '>i4'), ('_id', '>i8'),
+            ('len_first', '>i4'), ('first', '>i8'),
+            ('len_second', '>i4'), ('second', '>i8'),
+            ('len_is_directed', '>i4'), ('is_directed', 'u1'),
+            ('len_weight', '>i4'), ('weight', '>f8'),
+            ('len_label', '>i4'), ('label', '>i4'),
+        ])
+        rows = np.empty(len(batch), dtype=row_type)
+        rows['cnt_fields'] = 6
+        for name in ['_id', 'first', 'second', 'is_directed', 'weight', 'label']:
+            rows[name] = getattr(batch, name)
+            rows['len_' + name.lstrip('_')] = row_type[name].itemsize
+        header = b'PGCOPY\n\xff\r\n\x00' + \
+            np.zeros(2, dtype='>i4').tobytes()
+        trailer = np.array([-1], dtype='>i2').tobytes()
+        return header + rows.tobytes() + trailer
+
+    def upsert_statement(self, table: Table):
+        # https://docs.sqlalchemy.org/en/13/dialects/postgresql.html#insert-on-conflict-upsert
+        q = postgresql.insert(table)
+        return q.on_conflict_do_update(
+            index_elements=[table.c._id],
+            set_={c.name: q.excluded[c.name] for c in table.columns if c.name != '_id'},
+        )
+
+    def upsert_rows(self, table: Table, rows: Sequence[dict]) -> int:
+        """
+            Unlike `executemany`, which costs a round trip per row in `psycopg2`,
+            a multi-row `VALUES` sends the whole chunk as one statement.
+            The chunk is limited by `__max_query_params__` per statement.
+        """
+        names = [c.name for c in table.columns]
+        rows = self.rows_to_upsert(table, rows)
+        chunk_len = type(self).__max_query_params__ // len(names)
+        with self.get_session() as s:
+            for start in range(0, len(rows), chunk_len):
+                q = postgresql.insert(table).values(rows[start:start+chunk_len])
+                s.execute(q.on_conflict_do_update(
+                    index_elements=[table.c._id],
+                    set_={n: q.excluded[n] for n in names if n != '_id'},
+                ))
+        return len(rows)
 
     def upsert_table(self, source_name: str):
         # https://stackoverflow.com/a/17267423/2766161
@@ -53,7 +162,7 @@ class PostgreSQL(BaseSQL):
             INSERT INTO {EdgeSQL.__tablename__}
             SELECT * FROM {source_name}
             ON CONFLICT (_id) DO UPDATE SET
-            (first, second, weight, attributes_json) = (EXCLUDED.first, EXCLUDED.second, EXCLUDED.weight, EXCLUDED.attributes_json);
+            (first, second, is_directed, weight, label, payload_json) = (EXCLUDED.first, EXCLUDED.second, EXCLUDED.is_directed, EXCLUDED.weight, EXCLUDED.label, EXCLUDED.payload_json);
         '''
         with self.get_session() as s:
             s.execute(migration)
@@ -6,9 +6,12 @@ import random
 from random import SystemRandom
 from pathlib import Path
 import collections
+from concurrent.futures import ThreadPoolExecutor
 
 
+from PyStorageHelpers import Config
 from PyStorageHelpers.Edge import Edge
+from PyStorageHelpers.EdgeBatch import EdgeBatch
 
 
 def is_sequence_of(objs, expected_class) -> bool:
@@ -44,8 +47,23 @@ def remove_duplicate_edges(es: Sequence[Edge]) -> Sequence[Edge]:
 
 
 def chunks(iterable, size) -> Generator[list, None, None]:
+    """
+        Splits the iterable into lists of `size` objects.
+        An `EdgeBatch` or a stream of them is split into `EdgeBatch`es of `size` edges.
+    """
+    if isinstance(iterable, EdgeBatch):
+        iterable = [iterable]
+    iterator = iter(iterable)
+    missing = object()
+    first = next(iterator, missing)
+    if first is missing:
+        return
+    if isinstance(first, EdgeBatch):
+        yield from chunks_of_batches(chain([first], iterator), size)
+        return
+
     current = list()
-    for v in iterable:
+    for v in chain([first], iterator):
         if len(current) == size:
             yield current
             current = list()
@@ -54,6 +72,48 @@ def chunks(iterable, size) -> Generator[list, None, None]:
         yield current
 
 
+def chunks_of_batches(batches, size) -> Generator[EdgeBatch, None, None]:
+    pending = list()
+    pending_len = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_len += len(batch)
+        if pending_len < size:
+            continue
+        merged = EdgeBatch.concatenate(pending)
+        cnt_full = (len(merged) // size) * size
+        for start in range(0, cnt_full, size):
+            yield merged[start:start+size]
+        pending = [merged[cnt_full:]]
+        pending_len = len(merged) - cnt_full
+    if pending_len > 0:
+        yield EdgeBatch.concatenate(pending)
+
+
+def map_concurrently(func, iterable, max_workers: Optional[int] = None, max_pending: int = None) -> Generator[object, None, None]:
+    """
+        Applies `func` to every object of the `iterable` in a pool of threads,
+        yielding the results in the original order.
+        Only `max_pending` objects are submitted ahead of time, so long streams
+        aren't loaded into RAM. Exceptions are re-raised on the calling thread.
+        By default uses `Config.max_threads`, as it is at the time of the call.
+    """
+    if max_workers is None:
+        max_workers = Config.max_threads
+    if max_workers <= 1:
+        yield from map(func, iterable)
+        return
+    max_pending = max_pending or (max_workers * 2)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for o in iterable:
+            if len(pending) == max_pending:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, o))
+        while len(pending):
+            yield pending.popleft().result()
+
+
 def extract_database_name(url: str, default='graph') -> Tuple[str, str]:
     url = urlparse(url)
     address = f'{url.scheme}://{url.netloc}'
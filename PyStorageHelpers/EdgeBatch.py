@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+
+from PyStorageHelpers.Edge import Edge
+
+
+@dataclass(eq=False)
+class EdgeBatch:
+    """
+        Columnar container for many edges, where every attribute of `Edge`
+        (except the `payload`) is stored in a separate NumPy array.
+        Iterating over it yields `Edge` objects for backwards compatiability,
+        but backends can consume the columns directly.
+    """
+    _id: np.ndarray
+    first: np.ndarray
+    second: np.ndarray
+    weight: np.ndarray
+    label: np.ndarray
+    is_directed: np.ndarray
+
+    __columns__ = ['_id', 'first', 'second', 'weight', 'label', 'is_directed']
+
+    def __len__(self) -> int:
+        return len(self._id)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return Edge(**{name: value for name, value in zip(
+                EdgeBatch.__columns__,
+                [getattr(self, name)[key].item() for name in EdgeBatch.__columns__],
+            )})
+        return EdgeBatch(**{
+            name: getattr(self, name)[key] for name in EdgeBatch.__columns__
+        })
+
+    def __iter__(self):
+        return iter(self.to_edges())
+
+    def __repr__(self) -> str:
+        return f'<EdgeBatch(len={len(self)})>'
+
+    def to_dicts(self) -> List[dict]:
+        """
+            Exports rows in the shape expected by `bulk_insert_mappings` or `insert_many`,
+            with native Python types instead of NumPy scalars.
+        """
+        columns = [getattr(self, name).tolist() for name in EdgeBatch.__columns__]
+        return [dict(zip(EdgeBatch.__columns__, row)) for row in zip(*columns)]
+
+    def to_edges(self, edge_type: type = Edge) -> List[Edge]:
+        return [edge_type(**d) for d in self.to_dicts()]
+
+    @staticmethod
+    def from_columns(_id, first, second, weight=None, label=None, is_directed=True):
+        first = np.asarray(first, dtype=np.int64)
+        cnt = len(first)
+        if weight is None:
+            weight = np.ones(cnt, dtype=np.float64)
+        if label is None:
+            label = np.full(cnt, -1, dtype=np.int32)
+        if isinstance(is_directed, bool):
+            is_directed = np.full(cnt, is_directed, dtype=np.bool_)
+        return EdgeBatch(
+            _id=np.asarray(_id, dtype=np.int64),
+            first=first,
+            second=np.asarray(second, dtype=np.int64),
+            weight=np.asarray(weight, dtype=np.float64),
+            label=np.asarray(label, dtype=np.int32),
+            is_directed=np.asarray(is_directed, dtype=np.bool_),
+        )
+
+    @staticmethod
+    def from_edges(es: Sequence[Edge]):
+        cnt = len(es)
+        return EdgeBatch(
+            _id=np.fromiter((e._id for e in es), dtype=np.int64, count=cnt),
+            first=np.fromiter((e.first for e in es), dtype=np.int64, count=cnt),
+            second=np.fromiter((e.second for e in es), dtype=np.int64, count=cnt),
+            weight=np.fromiter((e.weight for e in es), dtype=np.float64, count=cnt),
+            label=np.fromiter((e.label for e in es), dtype=np.int32, count=cnt),
+            is_directed=np.fromiter((e.is_directed for e in es), dtype=np.bool_, count=cnt),
+        )
+
+    @staticmethod
+    def concatenate(batches: Sequence):
+        return EdgeBatch(**{
+            name: np.concatenate([getattr(b, name) for b in batches])
+            for name in EdgeBatch.__columns__
+        })
@@ -0,0 +1,35 @@
+from typing import List, Optional, Dict, Generator, Set, Tuple, Sequence
+
+import pymongo
+from pymongo import UpdateOne
+
+# Not re-exported from `PyStorageHelpers`, as `pymongo` is an optional dependency.
+
+
+def write_mongo_dicts(target, docs: Sequence[dict], upsert=True, session=None) -> Tuple[int, list]:
+    """
+        Sends a single unordered bulk request to the `target` collection.
+        Returns the number of inserted or upserted documents
+        and the list of write errors, instead of raising them,
+        so that concurrent batches can report them together.
+    """
+    if upsert:
+        def make_upsert(doc):
+            return UpdateOne(
+                filter={'_id': doc['_id'], },
+                update={'$set': doc, },
+                upsert=True,
+            )
+        try:
+            result = target.bulk_write(
+                requests=list(map(make_upsert, docs)), ordered=False, session=session)
+            details = result.bulk_api_result
+        except pymongo.errors.BulkWriteError as bwe:
+            details = bwe.details
+        return details['nInserted'] + details['nUpserted'], details['writeErrors']
+    else:
+        try:
+            result = target.insert_many(docs, ordered=False, session=session)
+            return len(result.inserted_ids), []
+        except pymongo.errors.BulkWriteError as bwe:
+            return bwe.details['nInserted'], bwe.details['writeErrors']
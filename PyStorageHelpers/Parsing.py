@@ -1,11 +1,19 @@
 from typing import List, Optional, Dict, Generator, Set, Tuple, Sequence, Generator
 import csv
+import io
 from pathlib import Path
 import sys
 import os.path
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 from PyStorageHelpers.Edge import Edge
+from PyStorageHelpers.EdgeBatch import EdgeBatch
 from PyStorageHelpers.Text import Text
+from PyStorageHelpers import Config
+from PyStorageHelpers.Algorithms import chunks, chunks_of_batches
 
 
 def allow_big_csv_fields():
@@ -28,7 +36,18 @@ def allow_big_csv_fields():
 
 # region Graphs
 
-def yield_edges_from_csv(filepath: str, edge_type: type = Edge, is_directed=True) -> Generator[Edge, None, None]:
+def yield_edges_from_csv(filepath: str, edge_type: type = Edge, is_directed=True, batch_size: int = None) -> Generator[Edge, None, None]:
+    """
+        Yields `Edge`s or, if `batch_size` is set, `EdgeBatch`es of that length
+        parsed in parallel by `yield_edge_batches_from_csv`.
+        Batches are always columnar, so a custom `edge_type` can't be combined with them.
+    """
+    if batch_size:
+        if edge_type is not Edge:
+            raise ValueError('Custom `edge_type` is not supported with `batch_size`')
+        yield from yield_edge_batches_from_csv(filepath, batch_size, is_directed=is_directed)
+        return
+
     with open(filepath, 'r') as f:
         reader = csv.reader(f, delimiter=',')
         # Skip the header line.
@@ -44,12 +63,399 @@ def yield_edges_from_csv(filepath: str, edge_type: type = Edge, is_directed=True
             yield edge_type(_id=idx, first=first, second=second, weight=w, is_directed=is_directed)
 
 
+def yield_edge_batches_from_csv(filepath: str, batch_size: int, is_directed=True, max_workers: Optional[int] = None, range_size: int = 64 * (2 ** 20)) -> Generator[EdgeBatch, None, None]:
+    """
+        Splits the file into byte ranges of roughly `range_size` aligned to line breaks,
+        parses them in `max_workers` processes and yields batches in the original order.
+        IDs are global row indexes, just like in the sequential `yield_edges_from_csv`.
+
+        CAUTION:
+        Quoted fields with line breaks aren't supported, which is fine for adjacency lists.
+    """
+    if max_workers is None:
+        max_workers = Config.max_threads
+    ranges = split_file_into_ranges(filepath, range_size)
+    if max_workers <= 1 or len(ranges) <= 1:
+        results = (parse_edges_in_range(filepath, start, end) for start, end in ranges)
+        yield from chunks_of_batches(yield_batches_with_ids(results, is_directed), batch_size)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        def results():
+            # Keep only a few ranges in flight to bound the memory usage.
+            pending = collections.deque()
+            for start, end in ranges:
+                pending.append(executor.submit(
+                    parse_edges_in_range, filepath, start, end))
+                if len(pending) >= 2 * max_workers:
+                    yield pending.popleft().result()
+            while len(pending):
+                yield pending.popleft().result()
+
+        yield from chunks_of_batches(yield_batches_with_ids(results(), is_directed), batch_size)
+
+
+def split_file_into_ranges(filepath: str, range_size: int) -> List[Tuple[int, int]]:
+    """
+        Returns `(start, end)` byte offsets of line-aligned parts of the file,
+        skipping the header line.
+    """
+    ranges = list()
+    with open(filepath, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        file_size = os.fstat(f.fileno()).st_size
+        while start < file_size:
+            f.seek(min(start + range_size, file_size))
+            # Finish the current line, unless we are already at the end.
+            if f.tell() < file_size:
+                f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_edges_in_range(filepath: str, start: int, end: int) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+        Parses rows between byte offsets, returning the number of lines in the range
+        and the columns of valid rows: `(cnt_lines, row_idxs, firsts, seconds, weights)`.
+    """
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).decode('utf-8').splitlines()
+    idxs, firsts, seconds, weights = [], [], [], []
+    for idx, row in enumerate(csv.reader(lines, delimiter=',')):
+        if len(row) < 2:
+            continue
+        idxs.append(idx)
+        firsts.append(int(row[0]))
+        seconds.append(int(row[1]))
+        has_weight = (len(row) > 2 and len(row[2]) > 0)
+        weights.append(float(row[2]) if has_weight else 1.0)
+    return (
+        len(lines),
+        np.array(idxs, dtype=np.int64),
+        np.array(firsts, dtype=np.int64),
+        np.array(seconds, dtype=np.int64),
+        np.array(weights, dtype=np.float64),
+    )
+
+
+def yield_batches_with_ids(results, is_directed=True) -> Generator[EdgeBatch, None, None]:
+    # Shifts local row indexes by the number of lines in preceding ranges.
+    cnt_preceding = 0
+    for cnt_lines, idxs, firsts, seconds, weights in results:
+        if len(idxs):
+            yield EdgeBatch.from_columns(
+                idxs + cnt_preceding, firsts, seconds, weights, is_directed=is_directed)
+        cnt_preceding += cnt_lines
+
+
+def read_mtx_header(filepath: str) -> dict:
+    """
+        Parses the comment lines of networkrepository `.edges`, Matrix Market `.mtx`
+        or SNAP `.txt` files. Returns the `is_directed` and `is_weighted` flags,
+        the number of edges `cnt_edges`, if it was declared, and the `data_offset`
+        of the first adjacency line.
+    """
+    is_directed = True
+    is_weighted = None
+    cnt_edges = None
+    is_mtx = False
+    with open(filepath, 'rb') as f:
+        while True:
+            offset = f.tell()
+            line = f.readline().decode('utf-8')
+            if len(line) == 0:
+                break
+            stripped = line.strip()
+            if len(stripped) == 0:
+                continue
+            is_comment = stripped[0] in '%#'
+            words = stripped.lstrip('%#').lower().replace(':', ' ').split()
+
+            if is_comment and stripped.lower().startswith('%%matrixmarket'):
+                is_mtx = True
+            if is_comment:
+                if 'undirected' in words or 'symmetric' in words:
+                    is_directed = False
+                if 'unweighted' in words or 'pattern' in words:
+                    is_weighted = False
+                elif 'weighted' in words or 'real' in words or 'integer' in words:
+                    is_weighted = True
+                # SNAP: "# Nodes: 4039 Edges: 88234".
+                if 'edges' in words and words.index('edges') + 1 < len(words):
+                    cnt_edges = int(words[words.index('edges') + 1])
+                # networkrepository: "% rows cols nnz".
+                if len(words) == 3 and all(w.isdigit() for w in words):
+                    cnt_edges = int(words[2])
+                continue
+
+            # Matrix Market: the first uncommented line is "rows cols nnz".
+            if is_mtx and cnt_edges is None and len(words) == 3:
+                cnt_edges = int(words[2])
+                continue
+            return dict(
+                is_directed=is_directed,
+                is_weighted=is_weighted,
+                cnt_edges=cnt_edges,
+                data_offset=offset,
+                cnt_columns=len(words),
+            )
+
+    return dict(
+        is_directed=is_directed,
+        is_weighted=is_weighted,
+        cnt_edges=0,
+        data_offset=offset,
+        cnt_columns=0,
+    )
+
+
+def yield_edge_batches_from_mtx(filepath: str, batch_size: int, block_size: int = 16 * (2 ** 20)) -> Generator[EdgeBatch, None, None]:
+    """
+        Parses whitespace-separated adjacency lines in blocks of `block_size` bytes,
+        converting every block with a single NumPy call.
+        IDs are parsed as `int64`, so they stay exact beyond 2**53,
+        and malformed lines raise a `ValueError` instead of truncating the block.
+        Edge direction is taken from the header. Weights are only imported
+        if the header doesn't mark the graph as unweighted, as the third column
+        in networkrepository files may also contain timestamps.
+    """
+    header = read_mtx_header(filepath)
+    cnt_columns = header['cnt_columns']
+    if cnt_columns < 2:
+        return
+    has_weights = (cnt_columns > 2 and header['is_weighted'] is not False)
+    columns = [('first', np.int64), ('second', np.int64)]
+    if has_weights:
+        columns.append(('weight', np.float64))
+
+    def batches():
+        cnt_preceding = 0
+        tail = b''
+        with open(filepath, 'rb') as f:
+            f.seek(header['data_offset'])
+            while True:
+                block = f.read(block_size)
+                is_last = len(block) == 0
+                block = tail + block
+                if not is_last:
+                    last_line_end = block.rfind(b'\n') + 1
+                    block, tail = block[:last_line_end], block[last_line_end:]
+                if len(block.strip()) > 0:
+                    values = np.loadtxt(
+                        io.BytesIO(block),
+                        dtype=np.dtype(columns),
+                        comments=('%', '#'),
+                        usecols=range(len(columns)),
+                        ndmin=1,
+                    )
+                    cnt = len(values)
+                    yield EdgeBatch.from_columns(
+                        np.arange(cnt_preceding, cnt_preceding + cnt),
+                        values['first'],
+                        values['second'],
+                        values['weight'] if has_weights else None,
+                        is_directed=header['is_directed'],
+                    )
+                    cnt_preceding += cnt
+                if is_last:
+                    break
+
+    yield from chunks_of_batches(batches(), batch_size)
+
+
+def read_edges_from_mtx(filepath: str) -> EdgeBatch:
+    """
+        Loads the whole file into a single `EdgeBatch`.
+        If the header declares the number of edges, the columns are
+        preallocated and filled block by block.
+    """
+    cnt_edges = read_mtx_header(filepath)['cnt_edges']
+    block_len = 2 ** 20
+    if not cnt_edges:
+        return EdgeBatch.concatenate([
+            EdgeBatch.from_columns([], [], []),
+            *yield_edge_batches_from_mtx(filepath, block_len),
+        ])
+
+    result = EdgeBatch.from_columns(
+        np.zeros(cnt_edges, dtype=np.int64),
+        np.zeros(cnt_edges, dtype=np.int64),
+        np.zeros(cnt_edges, dtype=np.int64),
+    )
+    cnt_filled = 0
+    for batch in yield_edge_batches_from_mtx(filepath, block_len):
+        if cnt_filled + len(batch) > cnt_edges:
+            raise ValueError(
+                f'Header of {filepath} declares only {cnt_edges} edges')
+        for name in EdgeBatch.__columns__:
+            getattr(result, name)[cnt_filled:cnt_filled+len(batch)] = getattr(batch, name)
+        cnt_filled += len(batch)
+    return result[:cnt_filled]
+
+
+# Binary edge lists start with a fixed header, followed by chunks.
+# Every chunk has its own header with statistics and 6 column arrays.
+# All the numbers are little-endian.
+binary_edges_magic = b'PSGEDGES'
+binary_edges_version = 1
+binary_edges_header = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('reserved', '<u4'),
+    ('cnt_edges', '<i8'),
+    ('cnt_chunks', '<i8'),
+])
+binary_edges_chunk_header = np.dtype([
+    ('cnt_edges', '<i8'),
+    ('min_id', '<i8'),
+    ('max_id', '<i8'),
+    ('min_node_id', '<i8'),
+    ('max_node_id', '<i8'),
+    ('total_weight', '<f8'),
+])
+binary_edges_columns = [
+    ('_id', '<i8'),
+    ('first', '<i8'),
+    ('second', '<i8'),
+    ('weight', '<f4'),
+    ('label', '<i4'),
+    ('is_directed', '<u1'),
+]
+
+
+def export_edges(stream, filepath: str, chunk_size: int = 2 ** 20) -> int:
+    """
+        Writes a stream of `Edge`s or `EdgeBatch`es into a binary edge list.
+        The edges count in the header is patched once the stream is exhausted.
+    """
+    header = np.zeros(1, dtype=binary_edges_header)
+    header['magic'] = binary_edges_magic
+    header['version'] = binary_edges_version
+    cnt_edges = 0
+    cnt_chunks = 0
+    with open(filepath, 'wb') as f:
+        f.write(header.tobytes())
+        for es in chunks(stream, chunk_size):
+            batch = es if isinstance(es, EdgeBatch) else EdgeBatch.from_edges(es)
+            if len(batch) == 0:
+                continue
+            chunk_header = np.zeros(1, dtype=binary_edges_chunk_header)
+            chunk_header['cnt_edges'] = len(batch)
+            chunk_header['min_id'] = batch._id.min()
+            chunk_header['max_id'] = batch._id.max()
+            chunk_header['min_node_id'] = min(batch.first.min(), batch.second.min())
+            chunk_header['max_node_id'] = max(batch.first.max(), batch.second.max())
+            chunk_header['total_weight'] = batch.weight.sum()
+            f.write(chunk_header.tobytes())
+            for name, dtype in binary_edges_columns:
+                f.write(getattr(batch, name).astype(dtype).tobytes())
+            cnt_edges += len(batch)
+            cnt_chunks += 1
+
+        header['cnt_edges'] = cnt_edges
+        header['cnt_chunks'] = cnt_chunks
+        f.seek(0)
+        f.write(header.tobytes())
+    return cnt_edges
+
+
+def export_graph(gdb, filepath: str) -> int:
+    """
+        Snapshots all the edges of a graph into a binary edge list,
+        which can later be imported into any other backend.
+    """
+    return export_edges(gdb.edges, filepath)
+
+
+def read_binary_edges_header(filepath: str) -> dict:
+    header = np.fromfile(filepath, dtype=binary_edges_header, count=1)
+    if len(header) == 0 or header['magic'][0] != binary_edges_magic:
+        raise ValueError(f'{filepath} is not a binary edge list')
+    if header['version'][0] != binary_edges_version:
+        raise ValueError(
+            f'Unsupported binary edge list version: {header["version"][0]}')
+    return dict(
+        cnt_edges=int(header['cnt_edges'][0]),
+        cnt_chunks=int(header['cnt_chunks'][0]),
+    )
+
+
+def yield_edge_batches_from_binary(filepath: str, batch_size: int = None) -> Generator[EdgeBatch, None, None]:
+    """
+        Reads chunks of a binary edge list without any parsing,
+        optionally re-chunking them into batches of `batch_size`.
+    """
+    def batches():
+        cnt_chunks = read_binary_edges_header(filepath)['cnt_chunks']
+        with open(filepath, 'rb') as f:
+            f.seek(binary_edges_header.itemsize)
+            for _ in range(cnt_chunks):
+                chunk_header = np.fromfile(
+                    f, dtype=binary_edges_chunk_header, count=1)
+                cnt = int(chunk_header['cnt_edges'][0])
+                columns = {
+                    name: np.fromfile(f, dtype=dtype, count=cnt)
+                    for name, dtype in binary_edges_columns
+                }
+                yield EdgeBatch.from_columns(**columns)
+
+    if batch_size:
+        yield from chunks_of_batches(batches(), batch_size)
+    else:
+        yield from batches()
+
+
+def yield_edges_from_batches(batches) -> Generator[Edge, None, None]:
+    for batch in batches:
+        yield from batch.to_edges()
+
+
 def import_graph(gdb, filepath: str) -> int:
+    """
+        Streams `EdgeBatch`es only into backends marked with `__accepts_edge_batches__`.
+        Others receive single `Edge`s, as before.
+    """
+    accepts_batches = type(gdb).__accepts_edge_batches__
+    batch_size = type(gdb).__max_batch_size__ if accepts_batches else None
     if filepath.endswith('.csv'):
         if hasattr(gdb, 'add_from_csv'):
             return gdb.add_from_csv(filepath)
         elif hasattr(gdb, 'add_stream'):
-            return gdb.add_stream(yield_edges_from_csv(filepath, edge_type=type(gdb).__edge_type__))
+            return gdb.add_stream(yield_edges_from_csv(
+                filepath,
+                batch_size=batch_size,
+            ))
+
+    elif filepath.endswith('.bel'):
+        if hasattr(gdb, 'add_stream'):
+            batches = yield_edge_batches_from_binary(
+                filepath,
+                batch_size=type(gdb).__max_batch_size__,
+            )
+            return gdb.add_stream(batches if accepts_batches else yield_edges_from_batches(batches))
+
+    elif filepath.endswith(('.edges', '.mtx', '.txt')):
+        if hasattr(gdb, 'add_stream'):
+            # Files declaring a number of edges, that fits into `ram_limit`,
+            # are parsed into preallocated columns and then split.
+            cnt_edges = read_mtx_header(filepath)['cnt_edges']
+            empty = EdgeBatch.from_columns([], [], [])
+            bytes_per_edge = sum(getattr(empty, name).itemsize for name in EdgeBatch.__columns__)
+            if cnt_edges and cnt_edges * bytes_per_edge <= Config.ram_limit:
+                batches = chunks(
+                    read_edges_from_mtx(filepath),
+                    type(gdb).__max_batch_size__,
+                )
+            else:
+                batches = yield_edge_batches_from_mtx(
+                    filepath,
+                    batch_size=type(gdb).__max_batch_size__,
+                )
+            return gdb.add_stream(batches if accepts_batches else yield_edges_from_batches(batches))
 
     return 0
 
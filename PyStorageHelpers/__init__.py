@@ -1,5 +1,6 @@
 from PyStorageHelpers.Config import *
 from PyStorageHelpers.Edge import *
+from PyStorageHelpers.EdgeBatch import *
 from PyStorageHelpers.Node import *
 from PyStorageHelpers.GraphDegree import *
 from PyStorageHelpers.Text import *
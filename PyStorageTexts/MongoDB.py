@@ -6,6 +6,7 @@ from pymongo import UpdateOne, DeleteOne
 
 from PyStorageTexts.BaseAPI import BaseAPI
 from PyStorageHelpers import *
+from PyStorageHelpers.MongoWrites import write_mongo_dicts
 
 
 class MongoDB(BaseAPI):
@@ -27,6 +28,8 @@ class MongoDB(BaseAPI):
         _, db_name = extract_database_name(url)
         self.db = MongoClient(url)
         self.texts_collection = self.db[db_name]['texts']
+        # Errors collected by the last `add_stream`.
+        self.write_errors = list()
         self.create_indexes()
 
     def count_texts(self) -> int:
@@ -108,28 +111,11 @@ class MongoDB(BaseAPI):
             else:
                 return target.insert_one(obj.__dict__).acknowledged
         elif is_sequence_of(obj, Text):
-            if upsert:
-                def make_upsert(o):
-                    return UpdateOne(
-                        filter={'_id': o._id, },
-                        update={'$set': o.__dict__, },
-                        upsert=True,
-                    )
-                ops = list(map(make_upsert, obj))
-                try:
-                    result = target.bulk_write(
-                        requests=ops, ordered=False)
-                    cnt_old = result.bulk_api_result['nUpserted']
-                    cnt_new = result.bulk_api_result['nInserted']
-                    return cnt_new + cnt_old
-                except pymongo.errors.BulkWriteError as bwe:
-                    print(bwe)
-                    print(bwe.details['writeErrors'])
-                    return 0
-            else:
-                obj = [o.__dict__ for o in obj]
-                result = target.insert_many(obj, ordered=False)
-                return len(result.inserted_ids)
+            cnt_written, write_errors = write_mongo_dicts(
+                target, [o.__dict__ for o in obj], upsert=upsert)
+            if len(write_errors):
+                print(write_errors)
+            return cnt_written
 
         return super().add(obj, upsert=upsert)
 
@@ -155,11 +141,28 @@ class MongoDB(BaseAPI):
         self.texts_collection.drop()
         self.create_indexes()
 
-    def add_stream(self, stream, upsert=False) -> int:
+    def add_stream(self, stream, upsert=False, max_workers: Optional[int] = None) -> int:
+        """
+            Submits batches of `__max_batch_size__` texts concurrently
+            over the connection pool of `MongoClient`. Write errors of all
+            batches are collected into `write_errors`.
+        """
         # Current version of MongoDB driver is incapable of chunking the iterable input,
         # so it loads everything into RAM forcing the OS to allocate GBs of swap pages.
         # https://api.mongodb.com/python/current/api/pymongo/collection.html#pymongo.collection.Collection.insert_many
-        return super().add_stream(stream, upsert=upsert)
+        self.write_errors = list()
+        cnt_success = 0
+        for cnt_written, write_errors in map_concurrently(
+            lambda texts: write_mongo_dicts(
+                self.texts_collection, [t.__dict__ for t in texts], upsert=upsert),
+            chunks(stream, type(self).__max_batch_size__),
+            max_workers=max_workers,
+        ):
+            cnt_success += cnt_written
+            self.write_errors.extend(write_errors)
+        if len(self.write_errors):
+            print(f'Failed to write {len(self.write_errors)} texts, see `write_errors`')
+        return cnt_success
 
 # region Helpers
 